@@ -206,25 +206,214 @@
 """
 
 import os
+import queue
 import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
+import numpy as np
+
 # 현재 디렉토리를 Python 경로에 추가
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from rag.document_loader import DirectoryLoader, TextSplitter
+from rag.document_loader import (
+    DirectoryLoader,
+    Document,
+    TextSplitter,
+    load_files_prefetched,
+)
 from rag.embeddings import BGEEmbeddings
 from rag.vector_store import ChromaVectorStore
 
+# Rust 구현 splitter (설치되어 있으면 사용 - 전 코어 활용, ~10배 빠름)
+try:
+    from semantic_text_splitter import TextSplitter as RustTextSplitter
+    HAS_RUST_SPLITTER = True
+except ImportError:
+    HAS_RUST_SPLITTER = False
+
+# Arrow 파일 기반 스트리밍 (설치되어 있으면 청크를 RAM 대신 디스크에 보관)
+try:
+    import pyarrow as pa
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+
+# ChromaDB 배치 상한 → 배치당 Python/직렬화 오버헤드 최소화
+INGEST_BATCH = 5461
+
 
 # -------------------------------------------------------------------
-# 🔥 ChromaDB는 batch 크기가 너무 크면 오류가 발생한다
-#    → batch size 자동 분할 기능 추가
+# 🔥 로딩/분할은 CPU 싱글코어 병목 → ProcessPool로 전 코어 활용
 # -------------------------------------------------------------------
-def split_into_batches(items, batch_size):
-    """리스트를 batch 단위로 분할"""
-    for i in range(0, len(items), batch_size):
-        yield items[i:i + batch_size]
+# TextSplitter 설정 (워커 프로세스에서 재구성하므로 plain dict로 유지)
+SPLITTER_CONFIG = {
+    "chunk_size": 300,
+    "chunk_overlap": 100,
+    "separator": "\n\n",
+}
+
+
+def split_shard(shard):
+    """문서 샤드를 청크로 분할 (ProcessPool 워커)"""
+    splitter = TextSplitter(**SPLITTER_CONFIG)
+    return splitter.split_documents(shard)
+
+
+def split_documents_rust(documents):
+    """
+    semantic-text-splitter(Rust)로 문서 분할
+
+    순수 Python TextSplitter 대비 Rust+regex-automata 구현이라
+    대형 코퍼스에서 분할 단계가 수 배 빨라집니다.
+    청크별 메타데이터는 원본 문서에서 그대로 복사합니다.
+    """
+    # (최소, 최대) 범위 지정: 기존 chunk_size + overlap 여유분
+    rust_splitter = RustTextSplitter(
+        (SPLITTER_CONFIG["chunk_size"],
+         SPLITTER_CONFIG["chunk_size"] + SPLITTER_CONFIG["chunk_overlap"])
+    )
+
+    split_docs = []
+    for doc in documents:
+        chunks = rust_splitter.chunks(doc.page_content)
+        for i, chunk in enumerate(chunks):
+            chunk_metadata = doc.metadata.copy()
+            chunk_metadata["chunk_index"] = i
+            chunk_metadata["total_chunks"] = len(chunks)
+            split_docs.append(Document(page_content=chunk, metadata=chunk_metadata))
+
+    return split_docs
+
+
+def iter_split_documents(documents):
+    """
+    문서별로 청크 Document를 생성하는 제너레이터
+
+    전체 청크 리스트를 RAM에 보유하지 않으므로 Arrow 스트리밍 경로와
+    결합하면 코퍼스 크기와 무관하게 메모리가 일정하게 유지됩니다.
+    """
+    if HAS_RUST_SPLITTER:
+        for doc in documents:
+            yield from split_documents_rust([doc])
+    else:
+        with ProcessPoolExecutor() as pool:
+            for chunk_docs in pool.map(split_shard, ([d] for d in documents)):
+                yield from chunk_docs
+
+
+# Arrow 파일 스키마: 리스트 경로와 동일한 메타데이터를 보존해야
+# pyarrow 설치 여부에 따라 색인 내용이 달라지지 않음.
+# page/total_pages는 PDF에만 있으므로 nullable int64
+_ARROW_STR_COLS = ("source", "file_path", "file_type")
+_ARROW_INT_COLS = ("chunk_index", "total_chunks", "page", "total_pages")
+
+
+def write_chunks_to_arrow(chunk_iter, arrow_path, batch_size=INGEST_BATCH):
+    """
+    청크를 Arrow IPC 파일로 스트리밍 기록
+
+    컬럼: text(string) + 메타데이터 컬럼(_ARROW_STR_COLS/_ARROW_INT_COLS).
+    기록과 동시에 통계를 집계하며, (청크 수, 총 문자 수)를 반환합니다.
+    """
+    schema = pa.schema(
+        [("text", pa.string())]
+        + [(name, pa.string()) for name in _ARROW_STR_COLS]
+        + [(name, pa.int64()) for name in _ARROW_INT_COLS]
+    )
+
+    n_chunks = 0
+    total_chars = 0
+    columns = [name for name in schema.names]
+    buffers = {name: [] for name in columns}
+
+    with pa.OSFile(arrow_path, "wb") as sink:
+        with pa.ipc.new_file(sink, schema) as writer:
+
+            def flush():
+                writer.write_batch(pa.record_batch(
+                    [pa.array(buffers[name]) for name in columns],
+                    schema=schema
+                ))
+                for buf in buffers.values():
+                    buf.clear()
+
+            for doc in chunk_iter:
+                buffers["text"].append(doc.page_content)
+                buffers["source"].append(doc.metadata.get("source", "unknown"))
+                for name in _ARROW_STR_COLS[1:]:
+                    buffers[name].append(doc.metadata.get(name))
+                for name in _ARROW_INT_COLS:
+                    buffers[name].append(doc.metadata.get(name))
+                n_chunks += 1
+                total_chars += len(doc.page_content)
+
+                if len(buffers["text"]) >= batch_size:
+                    flush()
+
+            if buffers["text"]:
+                flush()
+
+    return n_chunks, total_chars
+
+
+def iter_chunk_batches_arrow(arrow_path):
+    """
+    Arrow 파일에서 (texts, metadatas) 배치를 순차적으로 읽는 제너레이터
+
+    memory_map으로 열기 때문에 읽는 배치만 페이지 캐시에 올라옵니다.
+    """
+    reader = pa.ipc.open_file(pa.memory_map(arrow_path))
+    meta_cols = _ARROW_STR_COLS + _ARROW_INT_COLS
+    # 반복되는 파일명/확장자는 sys.intern으로 같은 문자열 객체를 공유해
+    # 메모리와 SQLite 텍스트 캐시 부담을 줄임
+    intern = sys.intern
+    for batch_index in range(reader.num_record_batches):
+        record_batch = reader.get_batch(batch_index)
+        texts = record_batch.column("text").to_pylist()
+        col_values = [record_batch.column(name).to_pylist() for name in meta_cols]
+
+        # 메타데이터는 컬럼 배열에서 즉석 조립 - null 컬럼(txt/docx의
+        # page 등)은 리스트 경로처럼 키 자체를 생략
+        metadatas = []
+        for row in zip(*col_values):
+            meta = {}
+            for name, value in zip(meta_cols, row):
+                if value is None:
+                    continue
+                meta[name] = intern(value) if isinstance(value, str) else value
+            metadatas.append(meta)
+        yield texts, metadatas
+
+
+def embed_with_dedupe(embeddings_model, shard_texts):
+    """
+    중복 청크를 제거하고 고유 텍스트만 임베딩
+
+    오버랩 분할은 헤더/보일러플레이트 등 동일 청크를 자주 만들어내는데,
+    고유 문자열만 인코딩한 뒤 fancy indexing으로 원래 자리에 복원하면
+    중복분의 임베딩 연산을 전부 아낄 수 있습니다.
+    """
+    uniq = {}
+    new_texts = []
+    idx_map = []
+
+    for text in shard_texts:
+        j = uniq.get(text)
+        if j is None:
+            j = uniq[text] = len(new_texts)
+            new_texts.append(text)
+        idx_map.append(j)
+
+    uniq_embs = embeddings_model.embed_documents(new_texts)
+
+    if len(new_texts) < len(shard_texts):
+        print(f"   - 중복 제거: {len(shard_texts)}개 청크 중 {len(new_texts)}개만 임베딩")
+
+    # fancy indexing으로 중복 위치에 동일 벡터 복원 (데이터 복사 최소)
+    return uniq_embs[idx_map]
 
 
 def main():
@@ -248,7 +437,11 @@ def main():
     )
 
     try:
-        documents = loader.load()
+        file_paths = loader.list_files()
+
+        # 읽기 prefetch + 병렬 파싱 (입력 순서 보존)
+        documents = load_files_prefetched(file_paths)
+
         print(f"   ✓ {len(documents)}개 문서 로드 완료")
 
         if not documents:
@@ -268,20 +461,42 @@ def main():
     # 3. 텍스트 분할
     # -------------------------------------------------------------------
     print("\n✂️  2단계: 텍스트 분할 중...")
-    splitter = TextSplitter(
-        chunk_size=300,
-        chunk_overlap=100,
-        separator="\n\n"
-    )
+    arrow_path = None
+    split_docs = None
 
     try:
-        split_docs = splitter.split_documents(documents)
-        print(f"   ✓ {len(split_docs)}개 청크로 분할 완료")
+        if HAS_PYARROW:
+            # 청크를 RAM에 전부 들지 않고 Arrow 파일로 스트리밍 기록
+            # → 코퍼스 크기와 무관하게 메모리 사용량이 일정
+            print("   - Arrow 스트리밍 모드 사용")
+            arrow_path = str(Path(__file__).parent / "data" / "chunks.arrow")
+            n_chunks, total_chars = write_chunks_to_arrow(
+                iter_split_documents(documents), arrow_path
+            )
+        elif HAS_RUST_SPLITTER:
+            print("   - semantic-text-splitter (Rust) 사용")
+            split_docs = split_documents_rust(documents)
+            n_chunks = len(split_docs)
+            total_chars = sum(len(doc.page_content) for doc in split_docs)
+        else:
+            # 문서 리스트를 코어 수만큼 샤딩 후 병렬 분할
+            n_workers = min(os.cpu_count() or 1, len(documents))
+            shards = [documents[i::n_workers] for i in range(n_workers)]
+
+            split_docs = []
+            with ProcessPoolExecutor(max_workers=n_workers) as pool:
+                for shard_result in pool.map(split_shard, shards):
+                    split_docs.extend(shard_result)
+            n_chunks = len(split_docs)
+            total_chars = sum(len(doc.page_content) for doc in split_docs)
+
+        if n_chunks == 0:
+            print("⚠️  생성된 청크가 없습니다.")
+            return
 
-        total_chars = sum(len(doc.page_content) for doc in split_docs)
-        avg_chars = total_chars / len(split_docs)
+        print(f"   ✓ {n_chunks}개 청크로 분할 완료")
         print(f"   - 총 문자 수: {total_chars:,}자")
-        print(f"   - 평균 청크 크기: {avg_chars:.0f}자")
+        print(f"   - 평균 청크 크기: {total_chars / n_chunks:.0f}자")
 
     except Exception as e:
         print(f"\n❌ 텍스트 분할 실패: {e}")
@@ -300,59 +515,131 @@ def main():
         return
 
     # -------------------------------------------------------------------
-    # 5. 문서 임베딩 생성
+    # 5. 문서 임베딩 + ChromaDB 저장 (파이프라인)
     # -------------------------------------------------------------------
-    print("\n🔢 4단계: 문서 임베딩 중...")
-    texts = [d.page_content for d in split_docs]
-    metadatas = [d.metadata for d in split_docs]
-
-    try:
-        print(f"   - 총 {len(texts)}개 청크 임베딩 시작...")
-        doc_embeddings = embeddings_model.embed_documents(texts)
-        print(f"   ✓ 임베딩 생성 완료")
-
-    except Exception as e:
-        print(f"\n❌ 임베딩 생성 실패: {e}")
-        return
-
-    # -------------------------------------------------------------------
-    # 6. ChromaDB 저장
-    # -------------------------------------------------------------------
-    print("\n💾 5단계: ChromaDB에 저장 중...")
+    # 🔥 GPU 인코딩과 DB insert를 겹쳐서 실행:
+    #    producer가 다음 shard를 임베딩하는 동안 consumer 스레드가
+    #    이전 shard를 ChromaDB에 저장 (PyTorch가 GIL을 해제하므로 병렬 진행)
+    print("\n🔢 4-5단계: 문서 임베딩 + ChromaDB 저장 중...")
+
+    if arrow_path is not None:
+        # Arrow 파일에서 배치 단위로 스트리밍 (bounded memory)
+        chunk_batches = iter_chunk_batches_arrow(arrow_path)
+    else:
+        texts = [d.page_content for d in split_docs]
+        metadatas = [d.metadata for d in split_docs]
+        # 반복되는 파일명 문자열을 interning해 객체를 공유
+        for meta in metadatas:
+            if isinstance(meta.get("source"), str):
+                meta["source"] = sys.intern(meta["source"])
+        chunk_batches = (
+            (texts[i:i + INGEST_BATCH], metadatas[i:i + INGEST_BATCH])
+            for i in range(0, len(texts), INGEST_BATCH)
+        )
 
     try:
         # 기존 컬렉션 삭제 후 새로 시작
         vector_store = ChromaVectorStore(collection_name="commercial_analysis_docs")
 
+        # 대량 insert 전에 SQLite 쓰기 성능 튜닝 (WAL 등)
+        vector_store.tune_sqlite_pragmas()
+
         existing = vector_store.get_document_count()
         if existing > 0:
             print(f"⚠️ 기존 데이터 {existing}개 발견 → 삭제합니다.")
-            vector_store.delete_collection()
-            vector_store = ChromaVectorStore(collection_name="commercial_analysis_docs")
-            print("✓ 새 컬렉션 재생성 완료")
+            # 컬렉션 재생성 대신 행만 비워서 연결/캐시/PRAGMA 유지
+            vector_store.clear()
 
         # 🔥 batch 저장 처리
-        BATCH = 1000  # 안정적인 배치 크기
-        print(f"\n📦 batch 저장 시작 (batch 크기: {BATCH})")
-
-        total_added = 0
-        for batch_texts, batch_embs, batch_metas in zip(
-            split_into_batches(texts, BATCH),
-            split_into_batches(doc_embeddings, BATCH),
-            split_into_batches(metadatas, BATCH)
-        ):
-            ids = vector_store.add_documents(
-                texts=batch_texts,
-                embeddings=batch_embs,
-                metadatas=batch_metas
+        print(f"\n📦 파이프라인 시작 (shard 크기: {INGEST_BATCH})")
+
+        # 소비자 스레드: 큐에서 shard를 꺼내 ChromaDB에 저장
+        work_queue = queue.Queue(maxsize=2)  # bounded → 메모리 사용량 제한
+        insert_state = {"added": 0, "error": None}
+
+        def insert_worker():
+            while True:
+                item = work_queue.get()
+                if item is None:  # 종료 신호
+                    break
+                batch_texts, batch_embs, batch_metas = item
+                try:
+                    ids = vector_store.add_documents(
+                        texts=batch_texts,
+                        embeddings=batch_embs,
+                        metadatas=batch_metas
+                    )
+                    insert_state["added"] += len(ids)
+                    print(f"   - Batch 저장 완료 (누적: {insert_state['added']})")
+                except Exception as e:
+                    insert_state["error"] = e
+                    break
+
+        consumer = threading.Thread(target=insert_worker, daemon=True)
+        consumer.start()
+
+        # 임베딩은 memmap .npy에 기록 (검증/후처리 단계에서 재사용)
+        embeddings_path = str(Path(__file__).parent / "data" / "embeddings.npy")
+        doc_embeddings = np.lib.format.open_memmap(
+            embeddings_path,
+            mode="w+",
+            dtype=np.float32,
+            shape=(n_chunks, embeddings_model.get_embedding_dimension())
+        )
+
+        # 생산자: shard 단위로 임베딩 후 큐에 전달
+        print(f"   - 총 {n_chunks}개 청크 임베딩 시작...")
+        offset = 0
+        chunk_sources = []  # 검증 단계 출력용 (청크별 출처)
+        for batch_texts, batch_metas in chunk_batches:
+            if insert_state["error"] is not None:
+                break
+            shard_embs = embed_with_dedupe(embeddings_model, batch_texts)
+            doc_embeddings[offset:offset + len(batch_texts)] = shard_embs
+            item = (
+                batch_texts,
+                doc_embeddings[offset:offset + len(batch_texts)],
+                batch_metas
+            )
+            # 소비자가 에러로 먼저 종료하면 가득 찬 큐의 put이 영원히
+            # 블로킹되므로, 타임아웃으로 깨어나 에러를 확인한다
+            while True:
+                try:
+                    work_queue.put(item, timeout=1.0)
+                    break
+                except queue.Full:
+                    if insert_state["error"] is not None:
+                        break
+            offset += len(batch_texts)
+            chunk_sources.extend(
+                meta.get("source", "unknown") for meta in batch_metas
             )
-            total_added += len(ids)
-            print(f"   - Batch 저장 완료 (누적: {total_added})")
 
+        # 종료 신호: 소비자가 죽은 뒤에도 put(None)이 가득 찬 큐에서
+        # 무한 대기하지 않도록 동일하게 타임아웃 루프로 전달
+        while True:
+            try:
+                work_queue.put(None, timeout=1.0)
+                break
+            except queue.Full:
+                if insert_state["error"] is not None or not consumer.is_alive():
+                    break
+        consumer.join()
+        doc_embeddings.flush()
+
+        if insert_state["error"] is not None:
+            raise insert_state["error"]
+
+        total_added = insert_state["added"]
         print(f"\n   ✓ 최종 저장된 문서 수: {total_added}개")
 
+        # int8 양자화 사본 저장 (디스크/RAM 4배 절감)
+        # Retriever.rerank_int8이 읽는 사이드카 형식(차원별 스케일 +
+        # id 매핑)으로 생성 - 페이지 단위 순회라 메모리 사용도 제한됨
+        vector_store.store_quantized_copy()
+
     except Exception as e:
-        print(f"\n❌ ChromaDB 저장 실패: {e}")
+        print(f"\n❌ 임베딩/저장 파이프라인 실패: {e}")
         return
 
     # -------------------------------------------------------------------
@@ -363,14 +650,19 @@ def main():
     try:
         query = "강남에서 창업"
         query_emb = embeddings_model.embed_query(query)
-        res = vector_store.search(query_emb, top_k=3)
+
+        # Chroma/HNSW를 거치지 않고 보관 중인 임베딩 행렬에 직접 내적
+        # (BLAS GEMV 한 번이면 충분 - 임베딩 수치 자체를 검증)
+        scores = doc_embeddings @ query_emb
+        k = min(3, len(scores))
+        top_indices = np.argpartition(-scores, k - 1)[:k]
+        top_indices = top_indices[np.argsort(-scores[top_indices])]
 
         print(f"   - 검색 쿼리: {query}")
-        print(f"   - 결과 개수: {len(res['documents'])}")
+        print(f"   - 결과 개수: {k}")
 
-        for i in range(len(res["documents"])):
-            print(f"\n   [{i+1}] {res['metadatas'][i].get('source')}")
-            print(f"        {res['documents'][i][:100]}...")
+        for rank, idx in enumerate(top_indices, 1):
+            print(f"\n   [{rank}] {chunk_sources[idx]} (유사도: {scores[idx]:.3f})")
 
     except Exception as e:
         print(f"⚠️ 검색 테스트 오류: {e}")
@@ -8,13 +8,13 @@ from pydantic import BaseModel
 from dotenv import load_dotenv
 from typing import Optional, List, Dict, Any
 import os
-import json
+import orjson
 import asyncio
 import sys
 
-# RAG 모듈 import
-from rag.rag_chain import RAGChain
-from rag.retriever import Retriever
+# RAG 모듈은 get_rag_chain()에서 지연 import
+# (torch/sentence-transformers/chromadb를 여기서 import하면
+#  서버 기동이 5~15초 걸려 Lazy Loading 의도가 무력화됨)
 
 # ============================================
 # 환경 변수 로드
@@ -31,7 +31,12 @@ def get_rag_chain():
     global rag_chain
     if rag_chain is None:
         print("🚀 RAG 시스템 초기화 중... (첫 요청, 10~20초 소요)")
-        
+
+        # 무거운 모듈(torch 등)은 첫 요청 시점에 import
+        from rag.rag_chain import RAGChain
+        from rag.retriever import Retriever
+
+
         # Retriever 초기화 (환경 변수 사용)
         retriever = Retriever(
             top_k=int(os.getenv("RAG_TOP_K", "3")),
@@ -101,6 +106,18 @@ async def health_check():
 # RAG 챗봇 스트리밍 엔드포인트
 # ============================================
 
+# SSE 프레임 직렬화: 토큰 청크마다 dict를 만들지 않도록
+# 가장 빈번한 answer 이벤트는 프레임 템플릿을 미리 만들어 둠
+_ANSWER_PREFIX = b'data: {"event":"answer","content":'
+_FRAME_SUFFIX = b"}\n\n"
+_DONE_FRAME = b'data: {"event":"done"}\n\n'
+
+
+def _sse_frame(payload: dict) -> bytes:
+    """dict를 SSE 프레임 바이트로 직렬화 (orjson은 UTF-8 그대로 출력)"""
+    return b"data: " + orjson.dumps(payload) + b"\n\n"
+
+
 async def stream_rag_response(
     query: str,
     conversation_history: Optional[List[Dict[str, str]]] = None,
@@ -113,8 +130,8 @@ async def stream_rag_response(
         # RAG 체인 가져오기
         rag = get_rag_chain()
 
-        # 스트리밍 실행
-        for chunk in rag.stream_run(
+        # 스트리밍 실행 (비동기 제너레이터 → 이벤트 루프 블로킹 없음)
+        async for chunk in rag.astream_run(
             query=query,
             conversation_history=conversation_history,
             top_k=top_k
@@ -123,25 +140,27 @@ async def stream_rag_response(
             chunk_type = chunk.get("type")
             content = chunk.get("content")
 
-            if chunk_type == "sources":
+            if chunk_type == "status":
+                # 검색 진행 상태 전송 (UI 하트비트)
+                yield _sse_frame({"event": "status", "status": content})
+            elif chunk_type == "sources":
                 # 참고 문서 정보 전송
-                yield f"data: {json.dumps({'event': 'sources', 'sources': content}, ensure_ascii=False)}\n\n"
+                yield _sse_frame({"event": "sources", "sources": content})
             elif chunk_type == "answer":
-                # 답변 청크 전송
-                yield f"data: {json.dumps({'event': 'answer', 'content': content}, ensure_ascii=False)}\n\n"
+                # 답변 청크 전송 (가장 빈번한 경로 → 프리컴파일된 템플릿 사용)
+                yield _ANSWER_PREFIX + orjson.dumps(content) + _FRAME_SUFFIX
             elif chunk_type == "error":
                 # 에러 전송
-                yield f"data: {json.dumps({'event': 'error', 'message': content}, ensure_ascii=False)}\n\n"
+                yield _sse_frame({"event": "error", "message": content})
 
         # 스트리밍 완료
-        yield f"data: {json.dumps({'event': 'done'}, ensure_ascii=False)}\n\n"
+        yield _DONE_FRAME
 
     except Exception as e:
-        error_msg = json.dumps({
+        yield _sse_frame({
             "event": "error",
             "message": f"RAG 스트리밍 오류: {str(e)}"
-        }, ensure_ascii=False)
-        yield f"data: {error_msg}\n\n"
+        })
 
 
 @app.post("/api/rag-chat-stream")
@@ -5,8 +5,22 @@
 """
 
 from typing import List, Dict, Any, Optional
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
 from pathlib import Path
+import asyncio
 import os
+import re
+
+# Rust 기반 문장 분리기 (설치되어 있으면 사용)
+try:
+    import blingfire
+    HAS_BLINGFIRE = True
+except ImportError:
+    HAS_BLINGFIRE = False
+
+# 폴백용 문장 경계 정규식 (한국어/영어 종결 부호)
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?。…])\s+")
 
 
 class Document:
@@ -44,20 +58,24 @@ class TextLoader:
     def load(self) -> List[Document]:
         """텍스트 파일 로드"""
         try:
-            with open(self.file_path, "r", encoding=self.encoding) as f:
-                content = f.read()
-
-            metadata = {
-                "source": os.path.basename(self.file_path),
-                "file_path": self.file_path,
-                "file_type": "txt"
-            }
-
-            return [Document(page_content=content, metadata=metadata)]
+            with open(self.file_path, "rb") as f:
+                return self.load_from_bytes(f.read())
         except Exception as e:
             print(f"[ERROR] File load failed: {self.file_path}, Error: {e}")
             raise
 
+    def load_from_bytes(self, data: bytes) -> List[Document]:
+        """미리 읽어 둔 바이트에서 텍스트 파싱"""
+        content = data.decode(self.encoding)
+
+        metadata = {
+            "source": os.path.basename(self.file_path),
+            "file_path": self.file_path,
+            "file_type": "txt"
+        }
+
+        return [Document(page_content=content, metadata=metadata)]
+
 
 class PDFLoader:
     """PDF 파일 로더"""
@@ -71,10 +89,19 @@ class PDFLoader:
 
     def load(self) -> List[Document]:
         """PDF 파일 로드"""
+        try:
+            with open(self.file_path, "rb") as f:
+                return self.load_from_bytes(f.read())
+        except Exception as e:
+            print(f"[ERROR] PDF load failed: {self.file_path}, Error: {e}")
+            raise
+
+    def load_from_bytes(self, data: bytes) -> List[Document]:
+        """미리 읽어 둔 바이트에서 PDF 파싱"""
         try:
             from pypdf import PdfReader
 
-            reader = PdfReader(self.file_path)
+            reader = PdfReader(BytesIO(data))
             documents = []
 
             for page_num, page in enumerate(reader.pages):
@@ -108,10 +135,19 @@ class DOCXLoader:
 
     def load(self) -> List[Document]:
         """DOCX 파일 로드"""
+        try:
+            with open(self.file_path, "rb") as f:
+                return self.load_from_bytes(f.read())
+        except Exception as e:
+            print(f"[ERROR] DOCX load failed: {self.file_path}, Error: {e}")
+            raise
+
+    def load_from_bytes(self, data: bytes) -> List[Document]:
+        """미리 읽어 둔 바이트에서 DOCX 파싱"""
         try:
             from docx import Document as DocxDocument
 
-            doc = DocxDocument(self.file_path)
+            doc = DocxDocument(BytesIO(data))
             paragraphs = [para.text for para in doc.paragraphs if para.text.strip()]
             content = "\n\n".join(paragraphs)
 
@@ -127,6 +163,95 @@ class DOCXLoader:
             raise
 
 
+def get_loader(file_path: str):
+    """파일 확장자에 따라 적절한 로더 반환"""
+    ext = Path(file_path).suffix.lower()
+
+    if ext == ".txt" or ext == ".md":
+        return TextLoader(file_path)
+    elif ext == ".pdf":
+        return PDFLoader(file_path)
+    elif ext == ".docx":
+        return DOCXLoader(file_path)
+    else:
+        raise ValueError(f"지원하지 않는 파일 형식: {ext}")
+
+
+def load_single_file(file_path: str) -> List[Document]:
+    """
+    단일 파일 로드 (ProcessPool 워커로 사용 가능한 모듈 함수)
+
+    Args:
+        file_path: 파일 경로
+
+    Returns:
+        Document 리스트 (로드 실패 시 빈 리스트)
+    """
+    try:
+        return get_loader(file_path).load()
+    except Exception as e:
+        print(f"[WARN] File load failed (skipped): {Path(file_path).name}, Error: {e}")
+        return []
+
+
+def parse_bytes(file_path: str, data: bytes) -> List[Document]:
+    """
+    미리 읽어 둔 바이트를 확장자에 맞는 로더로 파싱 (ProcessPool 워커)
+
+    Args:
+        file_path: 원본 파일 경로 (메타데이터/로더 선택용)
+        data: 파일 내용 바이트
+
+    Returns:
+        Document 리스트 (파싱 실패 시 빈 리스트)
+    """
+    try:
+        return get_loader(file_path).load_from_bytes(data)
+    except Exception as e:
+        print(f"[WARN] File parse failed (skipped): {Path(file_path).name}, Error: {e}")
+        return []
+
+
+def load_files_prefetched(
+    file_paths: List[str],
+    max_concurrency: int = 64
+) -> List[Document]:
+    """
+    파일 읽기를 동시에 수행(prefetch)한 뒤 파싱을 프로세스 병렬로 실행
+
+    파일마다 open()/read()를 순차로 기다리는 대신 최대 max_concurrency개의
+    읽기를 겹쳐 SSD 큐를 채우고, 읽어 둔 바이트는 ProcessPool에서
+    파싱합니다. I/O 지연과 파싱 CPU 시간이 서로 겹쳐집니다.
+
+    Args:
+        file_paths: 파일 경로 리스트
+        max_concurrency: 동시 읽기 개수
+
+    Returns:
+        Document 리스트 (입력 순서 보존)
+    """
+    if not file_paths:
+        return []
+
+    async def _read_all():
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def _read_one(path):
+            async with semaphore:
+                return await asyncio.to_thread(Path(path).read_bytes)
+
+        return await asyncio.gather(*[_read_one(p) for p in file_paths])
+
+    raw_bytes = asyncio.run(_read_all())
+
+    documents = []
+    with ProcessPoolExecutor() as pool:
+        for docs in pool.map(parse_bytes, file_paths, raw_bytes):
+            documents.extend(docs)
+
+    return documents
+
+
 class DirectoryLoader:
     """디렉토리 내 모든 문서 로드"""
 
@@ -150,36 +275,28 @@ class DirectoryLoader:
         else:
             self.supported_extensions = supported_extensions
 
+    def list_files(self) -> List[str]:
+        """지원하는 확장자의 파일 경로 리스트 반환"""
+        return [
+            str(file_path)
+            for file_path in sorted(self.directory_path.glob(self.glob_pattern))
+            if file_path.is_file() and file_path.suffix in self.supported_extensions
+        ]
+
     def load(self) -> List[Document]:
         """디렉토리 내 모든 문서 로드"""
         documents = []
 
-        for file_path in self.directory_path.glob(self.glob_pattern):
-            if file_path.is_file() and file_path.suffix in self.supported_extensions:
-                print(f"[LOAD] Loading: {file_path.name}")
-                try:
-                    loader = self._get_loader(str(file_path))
-                    docs = loader.load()
-                    documents.extend(docs)
-                except Exception as e:
-                    print(f"[WARN] File load failed (skipped): {file_path.name}, Error: {e}")
-                    continue
+        for file_path in self.list_files():
+            print(f"[LOAD] Loading: {Path(file_path).name}")
+            documents.extend(load_single_file(file_path))
 
         print(f"[OK] Total {len(documents)} documents loaded")
         return documents
 
     def _get_loader(self, file_path: str):
         """파일 확장자에 따라 적절한 로더 반환"""
-        ext = Path(file_path).suffix.lower()
-
-        if ext == ".txt" or ext == ".md":
-            return TextLoader(file_path)
-        elif ext == ".pdf":
-            return PDFLoader(file_path)
-        elif ext == ".docx":
-            return DOCXLoader(file_path)
-        else:
-            raise ValueError(f"지원하지 않는 파일 형식: {ext}")
+        return get_loader(file_path)
 
 
 class TextSplitter:
@@ -220,32 +337,49 @@ class TextSplitter:
 
         return split_docs
 
+    def _split_sentences(self, text: str) -> List[str]:
+        """
+        문장 단위로 분리
+
+        blingfire가 설치되어 있으면 Rust 속도의 문장 분리기를 사용하고,
+        없으면 종결 부호 기반 정규식으로 폴백합니다.
+        """
+        sentences = []
+        for paragraph in text.split(self.separator):
+            paragraph = paragraph.strip()
+            if not paragraph:
+                continue
+
+            if HAS_BLINGFIRE:
+                parts = blingfire.text_to_sentences(paragraph).split("\n")
+            else:
+                parts = _SENTENCE_END_RE.split(paragraph)
+
+            sentences.extend(s.strip() for s in parts if s.strip())
+
+        return sentences
+
     def _split_text(self, text: str) -> List[str]:
         """텍스트를 청크로 분할"""
         if not text or not text.strip():
             return []
 
-        # 구분자로 먼저 분할
-        splits = text.split(self.separator)
+        # 문장 단위로 먼저 분리한 뒤 chunk_size까지 탐욕적으로 채움
+        # → 문단이 길어도 문장 중간에서 잘리지 않음
         chunks = []
         current_chunk = ""
 
-        for split in splits:
-            # 현재 청크에 추가했을 때 크기 확인
-            if len(current_chunk) + len(split) + len(self.separator) <= self.chunk_size:
-                current_chunk += split + self.separator
-            else:
-                # 현재 청크 저장
-                if current_chunk.strip():
-                    chunks.append(current_chunk.strip())
-
-                # 새 청크 시작 (오버랩 고려)
-                if self.chunk_overlap > 0 and current_chunk:
-                    # 이전 청크의 끝부분을 포함
-                    overlap_text = current_chunk[-self.chunk_overlap:]
-                    current_chunk = overlap_text + split + self.separator
+        for sentence in self._split_sentences(text):
+            if current_chunk and len(current_chunk) + len(sentence) + 1 > self.chunk_size:
+                chunks.append(current_chunk.strip())
+
+                # 새 청크 시작 (오버랩 고려): 이전 청크의 끝부분을 포함
+                if self.chunk_overlap > 0:
+                    current_chunk = current_chunk[-self.chunk_overlap:]
                 else:
-                    current_chunk = split + self.separator
+                    current_chunk = ""
+
+            current_chunk = (current_chunk + " " + sentence) if current_chunk else sentence
 
         # 마지막 청크 저장
         if current_chunk.strip():
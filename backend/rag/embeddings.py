@@ -6,17 +6,83 @@ HuggingFace: dragonkue/BGE-m3-ko
 """
 
 from sentence_transformers import SentenceTransformer
-from typing import List, Union
+from typing import List, Optional, Union
+from pathlib import Path
+import hashlib
+import os
+import sqlite3
+import numpy as np
 import torch
 
 
+class EmbeddingCache:
+    """
+    SHA-256 내용 해시 기반 임베딩 디스크 캐시
+
+    (model_name, 청크 텍스트)의 SHA-256 해시를 키로 float16 벡터를
+    SQLite에 저장합니다. 재인덱싱 시 변경되지 않은 청크는
+    GPU 연산 없이 디스크에서 바로 읽어옵니다.
+    """
+
+    def __init__(self, db_path: str, model_name: str):
+        """
+        Args:
+            db_path: SQLite 파일 경로
+            model_name: 캐시 키에 포함할 모델 이름
+        """
+        self.model_name = model_name
+
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key BLOB PRIMARY KEY, vector BLOB)"
+        )
+        self.conn.commit()
+
+    def make_key(self, text: str) -> bytes:
+        """(모델 이름 + 텍스트)의 SHA-256 해시 키 생성"""
+        return hashlib.sha256(
+            (self.model_name + "\x00" + text).encode("utf-8")
+        ).digest()
+
+    def get_many(self, keys: List[bytes]) -> dict:
+        """키 리스트에 대한 캐시 조회 (key -> float32 벡터)"""
+        found = {}
+        # SQLite 변수 개수 제한(999)을 피하기 위해 나눠서 조회
+        for i in range(0, len(keys), 500):
+            batch = keys[i:i + 500]
+            placeholders = ",".join("?" for _ in batch)
+            rows = self.conn.execute(
+                f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})",
+                batch
+            ).fetchall()
+            for key, blob in rows:
+                found[key] = np.frombuffer(blob, dtype=np.float16).astype(np.float32)
+        return found
+
+    def put_many(self, keys: List[bytes], vectors: List[np.ndarray]):
+        """임베딩 벡터들을 float16으로 변환하여 단일 트랜잭션으로 저장"""
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                [
+                    (key, np.asarray(vec, dtype=np.float16).tobytes())
+                    for key, vec in zip(keys, vectors)
+                ]
+            )
+
+
 class BGEEmbeddings:
     """BGE-M3-KO 임베딩 모델 래퍼 클래스"""
 
     def __init__(
         self,
         model_name: str = "dragonkue/BGE-m3-ko",
-        device: str = None
+        device: str = None,
+        use_cache: bool = True,
+        cache_path: str = None,
+        encode_batch_size: int = None
     ):
         """
         BGE-M3-KO 임베딩 모델 초기화
@@ -24,7 +90,13 @@ class BGEEmbeddings:
         Args:
             model_name: HuggingFace 모델 이름 (기본값: dragonkue/BGE-m3-ko)
             device: 실행 디바이스 ('cuda', 'cpu', None=자동감지)
+            use_cache: 문서 임베딩 디스크 캐시 사용 여부
+            cache_path: 캐시 SQLite 파일 경로 (None이면 기본 경로 사용)
+            encode_batch_size: encode 배치 크기 (None=GPU 128 / CPU 32 자동)
         """
+        # Rust 토크나이저 스레드 병렬화 허용 (fork 경고 억제 목적의 기본값 해제)
+        os.environ.setdefault("TOKENIZERS_PARALLELISM", "true")
+
         # GPU 사용 가능 여부 자동 감지
         if device is None:
             self.device = "cuda" if torch.cuda.is_available() else "cpu"
@@ -36,12 +108,151 @@ class BGEEmbeddings:
         try:
             # SentenceTransformer 모델 로드
             self.model = SentenceTransformer(model_name, device=self.device)
+
+            # GPU에서는 FP16으로 변환 (처리량 2배↑, VRAM 사용량 절반↓)
+            if self.device == "cuda":
+                self.model.half()
+
+            # 느린 Python 토크나이저가 붙어 있으면 Fast(Rust) 버전으로 교체
+            self._ensure_fast_tokenizer(model_name)
+
             print(f"[OK] 모델 로드 완료: {model_name}")
         except Exception as e:
             print(f"[ERROR] 모델 로드 실패: {e}")
             raise
 
-    def embed_query(self, text: str) -> List[float]:
+        # GPU에서는 커널 퓨전으로 launch 오버헤드 감소
+        if self.device == "cuda":
+            self._apply_kernel_fusion()
+
+        # 문서 임베딩 디스크 캐시 초기화
+        self.cache = None
+        if use_cache:
+            if cache_path is None:
+                # 현재 파일 기준 상대 경로로 data/embedding_cache.db 설정
+                current_dir = Path(__file__).parent.parent
+                cache_path = str(current_dir / "data" / "embedding_cache.db")
+            try:
+                self.cache = EmbeddingCache(cache_path, model_name)
+                print(f"[OK] 임베딩 캐시 준비 완료: {cache_path}")
+            except Exception as e:
+                print(f"[WARN] 임베딩 캐시 초기화 실패 (캐시 없이 진행): {e}")
+
+        # 배치 크기: GPU는 큰 배치로 SM 점유율을 높이고, CPU는 보수적으로
+        if encode_batch_size is None:
+            encode_batch_size = 128 if self.device == "cuda" else 32
+        self.encode_batch_size = encode_batch_size
+
+        # CPU 전용 호스트: INT8 양자화 ONNX 모델이 준비되어 있으면 사용
+        self._ort_model = None
+        self._ort_tokenizer = None
+        if self.device == "cpu":
+            self._try_load_onnx()
+
+    def _ensure_fast_tokenizer(self, model_name: str):
+        """
+        Fast(Rust) 토크나이저 사용 보장
+
+        느린 Python 토크나이저가 로드된 경우 use_fast=True로 교체합니다.
+        Rust 토크나이저는 스레드 병렬로 동작해 한국어 텍스트에서도
+        토크나이즈가 병목이 되지 않습니다.
+        """
+        try:
+            from transformers import AutoTokenizer, PreTrainedTokenizerFast
+
+            if not isinstance(self.model.tokenizer, PreTrainedTokenizerFast):
+                self.model.tokenizer = AutoTokenizer.from_pretrained(
+                    model_name, use_fast=True
+                )
+                print("[OK] Fast(Rust) 토크나이저로 교체 완료")
+        except Exception as e:
+            print(f"[WARN] Fast 토크나이저 확인 실패 (기존 토크나이저 유지): {e}")
+
+    def _apply_kernel_fusion(self):
+        """
+        인코더에 커널 퓨전 적용 (BetterTransformer 우선, torch.compile 폴백)
+
+        BGE-M3 인코더는 attention/LayerNorm/GELU 등 작은 CUDA 커널을
+        다수 실행하는데, 퓨전하면 특히 짧은 시퀀스에서 launch 오버헤드가
+        크게 줄어듭니다. 둘 다 실패하면 기본 모델로 진행합니다.
+        """
+        fused = False
+        try:
+            from optimum.bettertransformer import BetterTransformer
+            self.model[0].auto_model = BetterTransformer.transform(
+                self.model[0].auto_model
+            )
+            print("[OK] BetterTransformer 변환 완료 (kernel fusion)")
+            fused = True
+        except Exception:
+            try:
+                # SentenceTransformer 전체를 compile하면 encode()가
+                # 원본 모듈로 위임되어 컴파일 래퍼를 타지 않는 no-op이 됨
+                # → BetterTransformer 분기처럼 내부 transformer를 교체
+                self.model[0].auto_model = torch.compile(
+                    self.model[0].auto_model, mode="reduce-overhead", fullgraph=False
+                )
+                print("[OK] torch.compile 적용 완료 (reduce-overhead)")
+                fused = True
+            except Exception as e:
+                print(f"[WARN] 커널 퓨전 적용 실패 (기본 모델로 진행): {e}")
+
+        if fused:
+            # 워밍업: 컴파일/그래프 캡처를 첫 사용자 요청이 아닌 지금 트리거
+            try:
+                self.model.encode(["warmup"] * 4, show_progress_bar=False)
+            except Exception:
+                pass
+
+    def _try_load_onnx(self, onnx_dir: str = None):
+        """
+        INT8 양자화 ONNX 모델 로드 시도 (CPU 추론 3~5배 가속)
+
+        사전 준비 (1회):
+            optimum-cli export onnx --model dragonkue/BGE-m3-ko \\
+                --task feature-extraction backend/data/bge-onnx-int8
+            optimum-cli onnxruntime quantize --avx512_vnni \\
+                --onnx_model backend/data/bge-onnx-int8
+
+        모델 디렉토리가 없거나 optimum/onnxruntime 미설치면
+        기존 PyTorch 경로로 그대로 진행합니다.
+        """
+        if onnx_dir is None:
+            current_dir = Path(__file__).parent.parent
+            onnx_dir = str(current_dir / "data" / "bge-onnx-int8")
+
+        if not os.path.isdir(onnx_dir):
+            return
+
+        try:
+            from optimum.onnxruntime import ORTModelForFeatureExtraction
+            from transformers import AutoTokenizer
+
+            self._ort_model = ORTModelForFeatureExtraction.from_pretrained(
+                onnx_dir, provider="CPUExecutionProvider"
+            )
+            self._ort_tokenizer = AutoTokenizer.from_pretrained(onnx_dir)
+            print(f"[OK] INT8 ONNX 모델 로드 완료 (CPU 가속): {onnx_dir}")
+        except Exception as e:
+            print(f"[WARN] ONNX 모델 로드 실패 (PyTorch로 진행): {e}")
+            self._ort_model = None
+            self._ort_tokenizer = None
+
+    def _encode_onnx(self, texts: List[str]) -> np.ndarray:
+        """ONNX Runtime으로 인코딩 (CLS 풀링, 정규화는 호출부에서 수행)"""
+        inputs = self._ort_tokenizer(
+            texts,
+            padding=True,
+            truncation=True,
+            max_length=512,
+            return_tensors="np"
+        )
+        outputs = self._ort_model(**inputs)
+        # BGE-M3는 CLS 토큰 풀링 사용
+        cls = outputs.last_hidden_state[:, 0]
+        return np.asarray(cls, dtype=np.float32)
+
+    def embed_query(self, text: str) -> np.ndarray:
         """
         단일 쿼리 텍스트를 임베딩 벡터로 변환
 
@@ -49,11 +260,19 @@ class BGEEmbeddings:
             text: 임베딩할 텍스트
 
         Returns:
-            임베딩 벡터 (list of floats)
+            임베딩 벡터 (float32 ndarray, shape=(D,))
         """
         if not text or not text.strip():
             raise ValueError("텍스트가 비어있습니다.")
 
+        # INT8 ONNX 경로 (CPU 가속)
+        if self._ort_model is not None:
+            embedding = self._encode_onnx([text])[0]
+            norm = float(np.linalg.norm(embedding))
+            if norm > 0:
+                embedding /= norm
+            return embedding
+
         # 임베딩 생성
         embedding = self.model.encode(
             text,
@@ -61,36 +280,131 @@ class BGEEmbeddings:
             normalize_embeddings=True  # 코사인 유사도 계산을 위한 정규화
         )
 
-        return embedding.tolist()
+        return np.asarray(embedding, dtype=np.float32)
 
-    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+    def embed_documents(self, texts: List[str]) -> np.ndarray:
         """
         여러 문서를 배치로 임베딩 벡터로 변환
 
+        Python float 리스트 대신 연속 메모리의 float32 ndarray를 반환하여
+        메모리 오버헤드(~8배)와 변환 비용을 제거합니다.
+
         Args:
             texts: 임베딩할 텍스트 리스트
 
         Returns:
-            임베딩 벡터 리스트
+            임베딩 벡터 (float32 ndarray, shape=(N, D))
         """
         if not texts:
-            return []
+            return np.empty((0, self.get_embedding_dimension()), dtype=np.float32)
 
         # 빈 텍스트 필터링
         valid_texts = [t for t in texts if t and t.strip()]
         if not valid_texts:
             raise ValueError("유효한 텍스트가 없습니다.")
 
-        # 배치 임베딩 생성
-        embeddings = self.model.encode(
-            valid_texts,
-            convert_to_numpy=True,
-            normalize_embeddings=True,
-            show_progress_bar=len(valid_texts) > 10,  # 10개 이상일 때만 진행바 표시
-            batch_size=32  # 배치 크기
-        )
+        # 캐시 조회: 이미 임베딩된 청크는 디스크에서 읽어옴
+        # __init__처럼 best-effort: 다른 프로세스가 SQLite 잠금을 쥐고
+        # 있는 등 캐시 접근이 실패해도 인덱싱은 캐시 없이 계속 진행
+        cached = None
+        if self.cache is not None:
+            keys = [self.cache.make_key(t) for t in valid_texts]
+            try:
+                cached = self.cache.get_many(keys)
+            except Exception as e:
+                print(f"[WARN] 임베딩 캐시 조회 실패 (캐시 없이 진행): {e}")
+
+        if cached is not None:
+            miss_indices = [i for i, key in enumerate(keys) if key not in cached]
+
+            if miss_indices:
+                print(f"[CACHE] {len(valid_texts) - len(miss_indices)}개 캐시 히트, "
+                      f"{len(miss_indices)}개 신규 임베딩")
+                miss_texts = [valid_texts[i] for i in miss_indices]
+                miss_embeddings = self._encode_batch(miss_texts)
+
+                # 신규 임베딩을 단일 트랜잭션으로 캐시에 저장 (best-effort)
+                try:
+                    self.cache.put_many(
+                        [keys[i] for i in miss_indices],
+                        list(miss_embeddings)
+                    )
+                except Exception as e:
+                    print(f"[WARN] 임베딩 캐시 저장 실패 (저장 생략): {e}")
+
+                for i, emb in zip(miss_indices, miss_embeddings):
+                    cached[keys[i]] = np.asarray(emb, dtype=np.float32)
+            else:
+                print(f"[CACHE] 전체 {len(valid_texts)}개 청크 캐시 히트")
+
+            # 원래 순서대로 재구성
+            return np.stack([cached[key] for key in keys]).astype(np.float32, copy=False)
+
+        # 캐시 미사용: 전체 배치 임베딩
+        embeddings = self._encode_batch(valid_texts)
+        return np.asarray(embeddings, dtype=np.float32)
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        """텍스트 리스트를 배치 임베딩 (numpy 배열 반환)"""
+        # 토크나이저가 어차피 자를 분량은 Python에서 미리 잘라
+        # O(N) 문자 스캔을 절약 (BGE-M3 최대 시퀀스보다 넉넉한 값)
+        texts = [t[:2048] if len(t) > 2048 else t for t in texts]
+
+        # Smart batching: 길이순으로 정렬해 배치 내 패딩 낭비를 최소화
+        # (토크나이저 호출 없이 문자 수로 근사 - BGE 토큰 수와 상관관계 높음)
+        if len(texts) > 1:
+            order = np.argsort([-len(t) for t in texts])
+            sorted_texts = [texts[i] for i in order]
+            emb = self._encode_sorted(sorted_texts)
+            # 원래 순서로 복원
+            out = np.empty_like(emb)
+            out[order] = emb
+            return out
+
+        return self._encode_sorted(texts)
+
+    def _encode_sorted(self, texts: List[str]) -> np.ndarray:
+        """정렬된 텍스트 리스트를 실제로 인코딩"""
+        n = len(texts)
+        batch_size = self.encode_batch_size
+
+        # 결과 버퍼를 한 번만 할당하고 배치 결과를 슬라이스에 직접 기록
+        # → encode 호출마다 생기는 (N, D) 중간 배열 할당/GC 제거
+        out = np.empty((n, self.get_embedding_dimension()), dtype=np.float32)
+
+        for i in range(0, n, batch_size):
+            batch = texts[i:i + batch_size]
+
+            if self._ort_model is not None:
+                # CPU: INT8 ONNX 경로 (VNNI int8 dot product)
+                out[i:i + batch_size] = self._encode_onnx(batch)
+            elif self.device == "cuda":
+                # AMP(FP16) + inference_mode로 GPU 처리량 극대화
+                with torch.inference_mode(), torch.autocast("cuda", dtype=torch.float16):
+                    embeddings = self.model.encode(
+                        batch,
+                        convert_to_tensor=True,
+                        normalize_embeddings=False,
+                        show_progress_bar=False,
+                        batch_size=batch_size
+                    )
+                out[i:i + batch_size] = embeddings.cpu().float().numpy()
+            else:
+                out[i:i + batch_size] = self.model.encode(
+                    batch,
+                    convert_to_numpy=True,
+                    normalize_embeddings=False,
+                    show_progress_bar=False,
+                    batch_size=batch_size
+                )
+
+        # L2 정규화는 배치별 GPU 커널 대신 최종 배열에 한 번만 수행
+        # (BLAS 벡터화된 단일 패스, 결과는 동일)
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0  # 0-벡터 나눗셈 방지
+        np.divide(out, norms, out=out)
 
-        return embeddings.tolist()
+        return out
 
     def get_embedding_dimension(self) -> int:
         """임베딩 벡터의 차원 수 반환"""
@@ -119,12 +433,12 @@ class LangChainBGEEmbeddings:
         self.embeddings = BGEEmbeddings(model_name=model_name, device=device)
 
     def embed_query(self, text: str) -> List[float]:
-        """LangChain 호환 쿼리 임베딩"""
-        return self.embeddings.embed_query(text)
+        """LangChain 호환 쿼리 임베딩 (LangChain은 list를 기대)"""
+        return self.embeddings.embed_query(text).tolist()
 
     def embed_documents(self, texts: List[str]) -> List[List[float]]:
-        """LangChain 호환 문서 임베딩"""
-        return self.embeddings.embed_documents(texts)
+        """LangChain 호환 문서 임베딩 (LangChain은 list를 기대)"""
+        return self.embeddings.embed_documents(texts).tolist()
 
 
 # 사용 예시
@@ -5,13 +5,139 @@ RAG (Retrieval-Augmented Generation) 파이프라인
 """
 
 from typing import List, Dict, Any, Optional
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
+import asyncio
+import atexit
+import logging
+import numpy as np
 import os
+import time
 from .retriever import Retriever
 from .embeddings import BGEEmbeddings
 from .vector_store import ChromaVectorStore
 
 
+# 요청당 여러 번 불리는 경로에서는 print 대신 logging 사용
+# (%s 지연 포매팅 → DEBUG 미사용 시 문자열 생성 비용 자체가 없음)
+_log = logging.getLogger("rag")
+
+# HTTP 커넥션 풀: 모듈 싱글턴으로 모든 RAGChain 인스턴스가 공유
+# (인스턴스마다 새 풀을 만들면 소켓이 새고 keep-alive/TLS 핸드셰이크
+# 재사용이 안 됨 - 체인을 요청마다 만드는 호출자에서 특히 치명적)
+try:
+    import httpx
+
+    _HTTP_CLIENT = httpx.Client(
+        timeout=httpx.Timeout(60.0, connect=10.0),
+        follow_redirects=True,
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+    )
+    _ASYNC_HTTP_CLIENT = httpx.AsyncClient(
+        timeout=httpx.Timeout(60.0, connect=10.0),
+        follow_redirects=True,
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+    )
+
+    def _close_http_clients():
+        try:
+            _HTTP_CLIENT.close()
+            asyncio.run(_ASYNC_HTTP_CLIENT.aclose())
+        except Exception:
+            pass
+
+    atexit.register(_close_http_clients)
+except ImportError:
+    _HTTP_CLIENT = None
+    _ASYNC_HTTP_CLIENT = None
+
+# 시스템 프롬프트: 모듈 상수로 한 번만 생성
+# 요청 간 바이트 단위로 동일해야 OpenAI의 프롬프트 프리픽스 캐시가
+# 적중하므로, 가변 내용(검색 문서/질문)은 user 메시지에만 넣는다
+_SYSTEM_PROMPT = """당신은 상권 분석 및 창업 컨설팅 전문가입니다.
+제공된 참고 문서를 바탕으로 정확하고 유용한 답변을 제공해주세요.
+
+답변 시 주의사항:
+1. 참고 문서의 내용을 기반으로 답변하되, 자연스럽게 설명해주세요.
+2. 참고 문서에 없는 내용은 "제공된 자료에는 해당 정보가 없습니다"라고 명확히 말해주세요.
+3. 가능한 한 구체적이고 실용적인 조언을 제공해주세요.
+4. 필요시 출처를 언급해주세요.
+"""
+
+
+class SemanticCache:
+    """
+    쿼리 임베딩 유사도 기반 응답 캐시
+
+    정규화된 쿼리 임베딩을 (N, D) 행렬로 보관하고, 새 쿼리와의
+    코사인 유사도(행렬-벡터 내적 한 번)가 임계값을 넘으면 저장된
+    답변+참고문서를 그대로 반환합니다. 반복/유사 질문이
+    임베딩+검색+LLM 왕복 없이 메모리 조회 속도로 응답됩니다.
+    """
+
+    def __init__(self, threshold: float = 0.95, max_size: int = 256):
+        """
+        Args:
+            threshold: 캐시 히트로 판정할 최소 코사인 유사도
+            max_size: 최대 캐시 항목 수 (초과 시 LRU 교체)
+        """
+        self.threshold = threshold
+        self.max_size = max_size
+
+        self._matrix = None       # (capacity, D) float32 정규화 쿼리 임베딩
+        self._payloads = []       # 행별 (answer, sources, ts)
+        self._last_used = []      # 행별 LRU 시각
+        self._clock = 0
+
+    def lookup(self, query_embedding: np.ndarray) -> Optional[Dict[str, Any]]:
+        """유사 쿼리 캐시 조회 (없으면 None)"""
+        size = len(self._payloads)
+        if size == 0:
+            return None
+
+        # 단일 BLAS GEMV로 전체 캐시와 유사도 계산
+        scores = self._matrix[:size] @ query_embedding
+        best = int(np.argmax(scores))
+
+        if float(scores[best]) < self.threshold:
+            return None
+
+        self._clock += 1
+        self._last_used[best] = self._clock
+        return self._payloads[best]
+
+    def add(self, query_embedding: np.ndarray, payload: Dict[str, Any]):
+        """새 쿼리/응답 쌍 저장 (가득 차면 LRU 항목 교체)"""
+        q = np.asarray(query_embedding, dtype=np.float32)
+        norm = float(np.linalg.norm(q))
+        if norm == 0:
+            return
+        q = q / norm
+
+        self._clock += 1
+        size = len(self._payloads)
+
+        if size >= self.max_size:
+            # LRU 교체
+            victim = int(np.argmin(self._last_used))
+            self._matrix[victim] = q
+            self._payloads[victim] = payload
+            self._last_used[victim] = self._clock
+            return
+
+        # 기하급수적 성장으로 vstack 비용 상각
+        if self._matrix is None:
+            self._matrix = np.empty((16, q.shape[0]), dtype=np.float32)
+        elif size >= len(self._matrix):
+            new_capacity = min(len(self._matrix) * 2, self.max_size)
+            grown = np.empty((new_capacity, q.shape[0]), dtype=np.float32)
+            grown[:size] = self._matrix[:size]
+            self._matrix = grown
+
+        self._matrix[size] = q
+        self._payloads.append(payload)
+        self._last_used.append(self._clock)
+
+
 class RAGChain:
     """RAG 파이프라인 클래스"""
 
@@ -21,7 +147,9 @@ class RAGChain:
         retriever: Retriever = None,
         model_name: str = "gpt-4o-mini",
         temperature: float = 0.7,
-        max_tokens: int = 1000
+        max_tokens: int = 1000,
+        cache_threshold: float = 0.95,
+        cache_size: int = 256
     ):
         """
         RAG 파이프라인 초기화
@@ -32,6 +160,8 @@ class RAGChain:
             model_name: OpenAI 모델 이름
             temperature: 생성 온도 (0~2)
             max_tokens: 최대 토큰 수
+            cache_threshold: 시맨틱 캐시 히트 최소 유사도
+            cache_size: 시맨틱 캐시 최대 항목 수 (0이면 비활성화)
         """
         # OpenAI API 키 설정
         if openai_api_key is None:
@@ -41,32 +171,41 @@ class RAGChain:
 
         # OpenAI 클라이언트 초기화
         # proxies 인자 문제 해결: httpx 클라이언트를 명시적으로 설정
-        try:
-            import httpx
-            # httpx 클라이언트 생성 (proxies 없이)
-            http_client = httpx.Client(
-                timeout=httpx.Timeout(60.0, connect=10.0),
-                follow_redirects=True,
-            )
+        # 커넥션 풀은 모듈 싱글턴을 공유 (인스턴스 간 keep-alive 재사용)
+        if _HTTP_CLIENT is not None:
             self.client = OpenAI(
                 api_key=openai_api_key,
-                http_client=http_client
+                http_client=_HTTP_CLIENT
             )
-        except ImportError:
+            # 비동기 클라이언트 (arun용)
+            self.async_client = AsyncOpenAI(
+                api_key=openai_api_key,
+                http_client=_ASYNC_HTTP_CLIENT
+            )
+        else:
             # httpx가 없으면 기본 방식으로 초기화
             self.client = OpenAI(api_key=openai_api_key)
+            self.async_client = AsyncOpenAI(api_key=openai_api_key)
         self.model_name = model_name
         self.temperature = temperature
         self.max_tokens = max_tokens
 
         # 검색기 초기화
         if retriever is None:
-            print("🔧 기본 Retriever 초기화 중...")
+            _log.info("기본 Retriever 초기화 중...")
             self.retriever = Retriever()
         else:
             self.retriever = retriever
 
-        print(f"[OK] RAG 파이프라인 준비 완료 (모델: {model_name})")
+        # 시맨틱 캐시 초기화 (반복/유사 질문 대응)
+        if cache_size > 0:
+            self.semantic_cache = SemanticCache(
+                threshold=cache_threshold, max_size=cache_size
+            )
+        else:
+            self.semantic_cache = None
+
+        _log.info("RAG 파이프라인 준비 완료 (모델: %s)", model_name)
 
     def create_prompt(
         self,
@@ -85,17 +224,6 @@ class RAGChain:
         Returns:
             OpenAI 메시지 형식의 프롬프트
         """
-        # 시스템 프롬프트
-        system_prompt = """당신은 상권 분석 및 창업 컨설팅 전문가입니다.
-제공된 참고 문서를 바탕으로 정확하고 유용한 답변을 제공해주세요.
-
-답변 시 주의사항:
-1. 참고 문서의 내용을 기반으로 답변하되, 자연스럽게 설명해주세요.
-2. 참고 문서에 없는 내용은 "제공된 자료에는 해당 정보가 없습니다"라고 명확히 말해주세요.
-3. 가능한 한 구체적이고 실용적인 조언을 제공해주세요.
-4. 필요시 출처를 언급해주세요.
-"""
-
         # 검색된 문서 포맷팅
         context = self.retriever.format_documents_for_prompt(retrieved_docs)
 
@@ -109,8 +237,9 @@ class RAGChain:
 위 참고 문서를 바탕으로 사용자의 질문에 답변해주세요.
 """
 
-        # 메시지 구성
-        messages = [{"role": "system", "content": system_prompt}]
+        # 메시지 구성: 정적인 system 메시지가 항상 맨 앞
+        # (프리픽스 캐시 유지를 위해 system과 history 사이에 끼워넣지 않음)
+        messages = [{"role": "system", "content": _SYSTEM_PROMPT}]
 
         # 대화 기록 추가 (있으면)
         if conversation_history:
@@ -121,14 +250,17 @@ class RAGChain:
 
         return messages
 
-    def run(
+    async def arun(
         self,
         query: str,
         conversation_history: Optional[List[Dict[str, str]]] = None,
         top_k: int = 3
     ) -> Dict[str, Any]:
         """
-        RAG 파이프라인 실행
+        RAG 파이프라인 비동기 실행
+
+        검색은 스레드로 넘기고 LLM 호출은 AsyncOpenAI로 대기하므로
+        FastAPI 이벤트 루프가 여러 RAG 요청을 동시에 처리할 수 있습니다.
 
         Args:
             query: 사용자 질문
@@ -142,27 +274,154 @@ class RAGChain:
                 "query": "원본 질문"
             }
         """
-        print(f"\n[SEARCH] RAG 파이프라인 시작: {query}")
+        _log.debug("RAG 파이프라인 시작: %s", query)
+
+        # 0. 시맨틱 캐시 조회: 유사 질문이 최근에 있었으면 즉시 반환
+        # (search와 같은 LRU 경유 → 캐시 미스여도 forward pass는 한 번)
+        query_embedding = None
+        if self.semantic_cache is not None:
+            query_embedding = await asyncio.to_thread(
+                self.retriever.embed_query_cached, query
+            )
+            cached = self.semantic_cache.lookup(query_embedding)
+            if cached is not None:
+                _log.debug("시맨틱 캐시 히트 - LLM 호출 생략")
+                return {
+                    "answer": cached["answer"],
+                    "sources": cached["sources"],
+                    "query": query,
+                    "cached": True
+                }
 
-        # 1. 관련 문서 검색
-        print(f"[DOCS] 1단계: 문서 검색 (Top-{top_k})...")
-        retrieved_docs = self.retriever.search(query, top_k=top_k)
+        # 1. 관련 문서 검색 (스레드에서 실행 - 이벤트 루프 블로킹 방지)
+        # 쿼리 임베딩도 같이 받아서 캐시 저장/다운스트림 리랭킹에 재사용
+        _log.debug("1단계: 문서 검색 (Top-%d)...", top_k)
+        docs_task = asyncio.to_thread(
+            self.retriever.search, query, top_k, return_embedding=True
+        )
+        retrieved_docs, search_embedding = await docs_task
+        if query_embedding is None:
+            query_embedding = search_embedding
 
         if not retrieved_docs:
             return {
                 "answer": "죄송합니다. 관련된 정보를 찾을 수 없습니다. 다른 질문을 해주시겠어요?",
                 "sources": [],
+                "query": query,
+                "_query_embedding": query_embedding
+            }
+
+        _log.debug("%d개 문서 검색 완료", len(retrieved_docs))
+
+        # 2. 프롬프트 생성
+        _log.debug("2단계: 프롬프트 생성...")
+        messages = self.create_prompt(query, retrieved_docs, conversation_history)
+
+        # 3. LLM 호출
+        _log.debug("3단계: LLM 답변 생성...")
+        try:
+            response = await self.async_client.chat.completions.create(
+                model=self.model_name,
+                messages=messages,
+                temperature=self.temperature,
+                max_tokens=self.max_tokens
+            )
+
+            answer = response.choices[0].message.content
+            _log.debug("답변 생성 완료 (토큰: %d)", response.usage.total_tokens)
+
+            # 성공한 응답을 시맨틱 캐시에 저장
+            if self.semantic_cache is not None and query_embedding is not None:
+                self.semantic_cache.add(query_embedding, {
+                    "answer": answer,
+                    "sources": retrieved_docs,
+                    "ts": time.time()
+                })
+
+            return {
+                "answer": answer,
+                "sources": retrieved_docs,
+                "query": query,
+                # 내부 호출자용 쿼리 임베딩 (ndarray 그대로 - 리랭킹,
+                # 교차 컬렉션 검색 등에서 재임베딩 없이 소비)
+                "_query_embedding": query_embedding,
+                "usage": {
+                    "prompt_tokens": response.usage.prompt_tokens,
+                    "completion_tokens": response.usage.completion_tokens,
+                    "total_tokens": response.usage.total_tokens
+                }
+            }
+
+        except Exception as e:
+            _log.error("LLM 호출 실패: %s", e)
+            return {
+                "answer": f"죄송합니다. 답변 생성 중 오류가 발생했습니다: {str(e)}",
+                "sources": retrieved_docs,
                 "query": query
             }
 
-        print(f"   ✓ {len(retrieved_docs)}개 문서 검색 완료")
+    def run(
+        self,
+        query: str,
+        conversation_history: Optional[List[Dict[str, str]]] = None,
+        top_k: int = 3
+    ) -> Dict[str, Any]:
+        """
+        RAG 파이프라인 실행 (동기)
+
+        arun을 asyncio.run으로 감싸면 호출마다 이벤트 루프가 생겼다
+        닫히는데, 모듈 싱글턴 비동기 풀의 keep-alive 연결이 닫힌 루프에
+        묶여 두 번째 호출부터 깨집니다. 동기 경로는 동기 OpenAI
+        클라이언트(_HTTP_CLIENT 풀)로 직접 실행합니다.
+
+        Args:
+            query: 사용자 질문
+            conversation_history: 대화 기록
+            top_k: 검색할 문서 개수
+
+        Returns:
+            arun()과 동일
+        """
+        _log.debug("RAG 파이프라인 시작: %s", query)
+
+        # 0. 시맨틱 캐시 조회 (search와 같은 LRU 경유)
+        query_embedding = None
+        if self.semantic_cache is not None:
+            query_embedding = self.retriever.embed_query_cached(query)
+            cached = self.semantic_cache.lookup(query_embedding)
+            if cached is not None:
+                _log.debug("시맨틱 캐시 히트 - LLM 호출 생략")
+                return {
+                    "answer": cached["answer"],
+                    "sources": cached["sources"],
+                    "query": query,
+                    "cached": True
+                }
+
+        # 1. 관련 문서 검색
+        _log.debug("1단계: 문서 검색 (Top-%d)...", top_k)
+        retrieved_docs, search_embedding = self.retriever.search(
+            query, top_k, return_embedding=True
+        )
+        if query_embedding is None:
+            query_embedding = search_embedding
+
+        if not retrieved_docs:
+            return {
+                "answer": "죄송합니다. 관련된 정보를 찾을 수 없습니다. 다른 질문을 해주시겠어요?",
+                "sources": [],
+                "query": query,
+                "_query_embedding": query_embedding
+            }
+
+        _log.debug("%d개 문서 검색 완료", len(retrieved_docs))
 
         # 2. 프롬프트 생성
-        print(f"[STEP] 2단계: 프롬프트 생성...")
+        _log.debug("2단계: 프롬프트 생성...")
         messages = self.create_prompt(query, retrieved_docs, conversation_history)
 
         # 3. LLM 호출
-        print(f"[AI] 3단계: LLM 답변 생성...")
+        _log.debug("3단계: LLM 답변 생성...")
         try:
             response = self.client.chat.completions.create(
                 model=self.model_name,
@@ -172,12 +431,23 @@ class RAGChain:
             )
 
             answer = response.choices[0].message.content
-            print(f"   ✓ 답변 생성 완료 (토큰: {response.usage.total_tokens})")
+            _log.debug("답변 생성 완료 (토큰: %d)", response.usage.total_tokens)
+
+            # 성공한 응답을 시맨틱 캐시에 저장
+            if self.semantic_cache is not None and query_embedding is not None:
+                self.semantic_cache.add(query_embedding, {
+                    "answer": answer,
+                    "sources": retrieved_docs,
+                    "ts": time.time()
+                })
 
             return {
                 "answer": answer,
                 "sources": retrieved_docs,
                 "query": query,
+                # 내부 호출자용 쿼리 임베딩 (ndarray 그대로 - 리랭킹,
+                # 교차 컬렉션 검색 등에서 재임베딩 없이 소비)
+                "_query_embedding": query_embedding,
                 "usage": {
                     "prompt_tokens": response.usage.prompt_tokens,
                     "completion_tokens": response.usage.completion_tokens,
@@ -186,21 +456,24 @@ class RAGChain:
             }
 
         except Exception as e:
-            print(f"[ERROR] LLM 호출 실패: {e}")
+            _log.error("LLM 호출 실패: %s", e)
             return {
                 "answer": f"죄송합니다. 답변 생성 중 오류가 발생했습니다: {str(e)}",
                 "sources": retrieved_docs,
                 "query": query
             }
 
-    def stream_run(
+    async def astream_run(
         self,
         query: str,
         conversation_history: Optional[List[Dict[str, str]]] = None,
         top_k: int = 3
     ):
         """
-        RAG 파이프라인 스트리밍 실행
+        RAG 파이프라인 비동기 스트리밍 실행
+
+        검색을 백그라운드 태스크로 시작하고 즉시 status 이벤트를
+        내보내므로, UI가 임베딩+ANN 지연 동안에도 바로 그릴 수 있습니다.
 
         Args:
             query: 사용자 질문
@@ -210,9 +483,77 @@ class RAGChain:
         Yields:
             답변 청크 또는 메타데이터
         """
-        print(f"\n[SEARCH] RAG 파이프라인 시작 (스트리밍): {query}")
+        _log.debug("RAG 파이프라인 시작 (스트리밍): %s", query)
 
-        # 1. 관련 문서 검색
+        # 1. 관련 문서 검색을 백그라운드로 시작하고 하트비트 먼저 방출
+        docs_task = asyncio.create_task(
+            asyncio.to_thread(self.retriever.search, query, top_k)
+        )
+        yield {"type": "status", "content": "retrieving"}
+
+        retrieved_docs = await docs_task
+
+        if not retrieved_docs:
+            yield {
+                "type": "answer",
+                "content": "죄송합니다. 관련된 정보를 찾을 수 없습니다."
+            }
+            return
+
+        # 검색된 문서 정보 먼저 반환
+        yield {
+            "type": "sources",
+            "content": retrieved_docs
+        }
+
+        # 2. 프롬프트 생성
+        messages = self.create_prompt(query, retrieved_docs, conversation_history)
+
+        # 3. LLM 스트리밍 호출
+        try:
+            stream = await self.async_client.chat.completions.create(
+                model=self.model_name,
+                messages=messages,
+                temperature=self.temperature,
+                max_tokens=self.max_tokens,
+                stream=True
+            )
+
+            async for chunk in stream:
+                if chunk.choices[0].delta.content:
+                    yield {
+                        "type": "answer",
+                        "content": chunk.choices[0].delta.content
+                    }
+
+        except Exception as e:
+            _log.error("LLM 스트리밍 실패: %s", e)
+            yield {
+                "type": "error",
+                "content": str(e)
+            }
+
+    def stream_run(
+        self,
+        query: str,
+        conversation_history: Optional[List[Dict[str, str]]] = None,
+        top_k: int = 3
+    ):
+        """
+        RAG 파이프라인 스트리밍 실행 (동기)
+
+        astream_run을 일회용 이벤트 루프로 중계하면 공유 비동기 풀의
+        연결이 루프 종료와 함께 무효화되므로, 동기 경로는 동기 OpenAI
+        클라이언트로 같은 이벤트 시퀀스를 직접 생성합니다.
+
+        Yields:
+            답변 청크 또는 메타데이터 (astream_run과 동일 형식)
+        """
+        _log.debug("RAG 파이프라인 시작 (스트리밍): %s", query)
+
+        # 1. 관련 문서 검색 (동기 경로는 검색과 겹칠 작업이 없어
+        # status 이벤트만 먼저 내보내고 바로 검색)
+        yield {"type": "status", "content": "retrieving"}
         retrieved_docs = self.retriever.search(query, top_k=top_k)
 
         if not retrieved_docs:
@@ -249,7 +590,7 @@ class RAGChain:
                     }
 
         except Exception as e:
-            print(f"[ERROR] LLM 스트리밍 실패: {e}")
+            _log.error("LLM 스트리밍 실패: %s", e)
             yield {
                 "type": "error",
                 "content": str(e)
@@ -5,10 +5,55 @@
 """
 
 from typing import List, Dict, Any, Optional
+from functools import lru_cache
+from pathlib import Path
+import itertools
+import logging
+import weakref
+import numpy as np
 from .embeddings import BGEEmbeddings
 from .vector_store import ChromaVectorStore
 from .document_loader import Document
 
+# 선택 의존성: SIMD 코사인 커널 (없으면 NumPy BLAS 경로 사용)
+try:
+    import simsimd
+    HAS_SIMSIMD = True
+except ImportError:
+    HAS_SIMSIMD = False
+
+# lru_cache를 메서드에 직접 걸면 self가 캐시에 붙잡혀 누수되므로
+# 모듈 레벨 헬퍼 + 임베딩 모델 레지스트리로 우회.
+# 레지스트리는 약한 참조만 보관 → 재인덱싱 등으로 Retriever가 교체돼도
+# 수 GB짜리 BGE 모델이 여기 붙잡혀 남지 않음. 키는 재사용되지 않는
+# 일련번호라서 해제된 모델의 LRU 항목이 새 모델 결과로 둔갑할 수 없음
+_EMBED_REGISTRY: "weakref.WeakValueDictionary[int, BGEEmbeddings]" = (
+    weakref.WeakValueDictionary()
+)
+_EMBED_KEY_COUNTER = itertools.count()
+
+
+def _register_embeddings(model: BGEEmbeddings) -> int:
+    """임베딩 모델을 쿼리 캐시 레지스트리에 등록하고 캐시 키 반환"""
+    key = getattr(model, "_embed_registry_key", None)
+    if key is None or _EMBED_REGISTRY.get(key) is not model:
+        key = next(_EMBED_KEY_COUNTER)
+        model._embed_registry_key = key
+        _EMBED_REGISTRY[key] = model
+    return key
+
+# 요청당 여러 번 불리는 경로에서는 print 대신 logging 사용
+# (%s 지연 포매팅 → DEBUG 미사용 시 문자열 생성 비용 자체가 없음)
+_log = logging.getLogger("rag")
+
+
+@lru_cache(maxsize=1024)
+def _embed_query_cached(model_key: int, text: str) -> np.ndarray:
+    """쿼리 임베딩 LRU 캐시 (동일 질문 재전송 시 BGE forward pass 생략)"""
+    embedding = _EMBED_REGISTRY[model_key].embed_query(text)
+    embedding.setflags(write=False)  # 캐시로 공유되는 배열의 변조 방지
+    return embedding
+
 
 class Retriever:
     """문서 검색기 클래스"""
@@ -31,14 +76,14 @@ class Retriever:
         """
         # 임베딩 모델 초기화
         if embeddings is None:
-            print("🔧 기본 임베딩 모델(BGE-M3-KO) 초기화 중...")
+            _log.info("기본 임베딩 모델(BGE-M3-KO) 초기화 중...")
             self.embeddings = BGEEmbeddings()
         else:
             self.embeddings = embeddings
 
         # 벡터 스토어 초기화
         if vector_store is None:
-            print("🔧 기본 벡터 스토어(ChromaDB) 초기화 중...")
+            _log.info("기본 벡터 스토어(ChromaDB) 초기화 중...")
             self.vector_store = ChromaVectorStore()
         else:
             self.vector_store = vector_store
@@ -46,11 +91,33 @@ class Retriever:
         self.top_k = top_k
         self.score_threshold = score_threshold
 
+        # int8 리랭킹 사이드카 (rerank_int8 첫 호출 시 lazy 로드)
+        self._int8_matrix = None
+        self._int8_scale = None
+        self._int8_row_by_id = None
+
+        # 쿼리 임베딩 LRU 캐시용 레지스트리 등록
+        self._embed_key = _register_embeddings(self.embeddings)
+
+    def embed_query_cached(self, query: str) -> np.ndarray:
+        """
+        쿼리 임베딩 반환 (search와 동일한 LRU 캐시 공유)
+
+        시맨틱 캐시 조회처럼 search 밖에서 쿼리 벡터가 필요한 경우
+        embeddings.embed_query를 직접 부르면 LRU를 우회해 같은 질문에
+        BGE forward pass를 중복 지불하므로, 반드시 이 경로를 사용합니다.
+        """
+        return np.asarray(
+            _embed_query_cached(self._embed_key, query), dtype=np.float32
+        )
+
     def search(
         self,
         query: str,
         top_k: Optional[int] = None,
-        filter_metadata: Optional[Dict[str, Any]] = None
+        filter_metadata: Optional[Dict[str, Any]] = None,
+        rerank: bool = False,
+        return_embedding: bool = False
     ) -> List[Dict[str, Any]]:
         """
         쿼리에 대한 관련 문서 검색
@@ -59,6 +126,11 @@ class Retriever:
             query: 검색 쿼리
             top_k: 반환할 문서 개수 (None이면 기본값 사용)
             filter_metadata: 메타데이터 필터
+            rerank: 검색된 문서 임베딩을 받아 클라이언트에서 내적으로
+                정확한 유사도를 다시 계산 (Chroma distance는 순서/필터에만 사용)
+            return_embedding: True면 (결과, 쿼리 임베딩) 튜플 반환 -
+                다운스트림(리랭킹, 시맨틱 캐시, 다른 컬렉션 검색)에서
+                BGE forward pass를 반복하지 않도록 함
 
         Returns:
             검색 결과 리스트 [
@@ -77,44 +149,146 @@ class Retriever:
         # top_k 설정
         k = top_k if top_k is not None else self.top_k
 
-        # 쿼리 임베딩
-        print(f"[SEARCH] 검색 쿼리: {query}")
-        query_embedding = self.embeddings.embed_query(query)
+        # 쿼리 임베딩 (동일 질문은 LRU 캐시에서 재사용)
+        _log.debug("검색 쿼리: %s", query)
+        query_embedding = np.asarray(
+            _embed_query_cached(self._embed_key, query), dtype=np.float32
+        )
+
+        # 불용어/문장부호만으로 된 쿼리는 노름이 0에 가까운 임베딩이 되어
+        # 의미 없는 ANN 결과를 고신뢰로 반환하므로, Chroma 왕복 전에 차단
+        norm = float(np.linalg.norm(query_embedding))
+        if norm < 1e-3:
+            _log.warning("쿼리 임베딩 노름이 0에 가까움 (norm=%.2e) - 검색 생략: %s", norm, query)
+            return ([], query_embedding) if return_embedding else []
 
         # 벡터 검색
         results = self.vector_store.search(
             query_embedding=query_embedding,
             top_k=k,
-            filter_metadata=filter_metadata
+            filter_metadata=filter_metadata,
+            include_embeddings=rerank
         )
 
-        # 결과 포맷팅 및 필터링
+        # 결과 포맷팅 및 필터링 (NumPy 벡터 연산)
+        # top_k가 크면(리랭킹용 고recall 검색) 행별 Python 연산이 병목이라
+        # 점수 변환/임계값 필터를 배열 단위로 처리하고
+        # 살아남은 행에 대해서만 dict를 만든다
         formatted_results = []
-        for i, (doc, metadata, distance, doc_id) in enumerate(zip(
-            results["documents"],
-            results["metadatas"],
-            results["distances"],
-            results["ids"]
-        )):
-            # 유사도 점수 계산 (distance를 similarity로 변환)
-            # ChromaDB의 cosine distance: 0(완전 유사) ~ 2(완전 다름)
-            # 이를 similarity score로 변환: 1 - (distance/2)
-            similarity_score = 1 - (distance / 2)
-
-            # 임계값 필터링
-            if distance <= self.score_threshold or self.score_threshold <= 0:
+        d = np.asarray(results["distances"], dtype=np.float32)
+        if d.size:
+            if rerank and results.get("embeddings") is not None and len(results["embeddings"]):
+                # 클라이언트 측 정확 점수: BGE 임베딩은 단위 노름이므로
+                # 내적 한 번이 곧 코사인 유사도 (Chroma의 distance 메트릭
+                # 해석 차이에 휘둘리지 않는 권위값)
+                doc_embs = np.asarray(results["embeddings"], dtype=np.float32)
+                if HAS_SIMSIMD:
+                    exact = 1.0 - np.asarray(
+                        simsimd.cdist(query_embedding[None, :], doc_embs, metric="cosine"),
+                        dtype=np.float32
+                    ).ravel()
+                else:
+                    exact = doc_embs @ query_embedding
+                scores = np.round(exact, 4).tolist()
+            else:
+                # ChromaDB의 cosine distance: 0(완전 유사) ~ 2(완전 다름)
+                # 이를 similarity score로 변환: 1 - (distance/2)
+                scores = np.round(1.0 - d * 0.5, 4).tolist()
+            distances = np.round(d, 4).tolist()
+            keep = (d <= self.score_threshold) | (self.score_threshold <= 0)
+
+            for i in np.flatnonzero(keep):
                 formatted_results.append({
-                    "content": doc,
-                    "metadata": metadata,
-                    "score": round(similarity_score, 4),
-                    "distance": round(distance, 4),
-                    "id": doc_id,
-                    "rank": i + 1
+                    "content": results["documents"][i],
+                    "metadata": results["metadatas"][i],
+                    "score": scores[i],
+                    "distance": distances[i],
+                    "id": results["ids"][i],
+                    "rank": int(i) + 1
                 })
 
-        print(f"[OK] {len(formatted_results)}개 문서 검색 완료")
+        _log.debug("%d개 문서 검색 완료", len(formatted_results))
+        if return_embedding:
+            return formatted_results, query_embedding
         return formatted_results
 
+    def _load_int8_sidecar(self) -> bool:
+        """store_quantized_copy()가 만든 int8 사이드카를 memmap으로 로드"""
+        if self._int8_matrix is not None:
+            return True
+
+        data_dir = Path(self.vector_store.persist_directory).parent
+        int8_path = data_dir / "rerank_int8.npy"
+        scale_path = data_dir / "rerank_int8_scale.npy"
+        ids_path = data_dir / "rerank_int8_ids.npy"
+
+        if not (int8_path.exists() and scale_path.exists() and ids_path.exists()):
+            _log.warning(
+                "int8 사이드카가 없습니다 - store_quantized_copy()를 먼저 실행하세요"
+            )
+            return False
+
+        self._int8_matrix = np.load(int8_path, mmap_mode="r")
+        self._int8_scale = np.load(scale_path)
+        ids = np.load(ids_path)
+        self._int8_row_by_id = {doc_id: row for row, doc_id in enumerate(ids)}
+        return True
+
+    def rerank_int8(
+        self,
+        query: str,
+        candidate_ids: List[str],
+        k: int = 5
+    ) -> List[Dict[str, Any]]:
+        """
+        int8 양자화 임베딩으로 후보 문서를 인메모리 리랭킹
+
+        Chroma ANN으로 크게 뽑은 후보(top-200 등)를 fp32 대비 1/4
+        대역폭의 int8 행렬에서 코사인 유사도로 다시 정렬합니다.
+        simsimd가 설치되어 있으면 int8 SIMD 커널을 사용합니다.
+
+        Args:
+            query: 검색 쿼리
+            candidate_ids: 리랭킹할 후보 문서 ID 리스트
+            k: 반환할 상위 개수
+
+        Returns:
+            [{"id": ..., "score": ...}, ...] 점수 내림차순 상위 k개
+        """
+        if not candidate_ids or not self._load_int8_sidecar():
+            return []
+
+        # 사이드카에 존재하는 후보만 행 인덱스로 변환
+        rows_ids = [(self._int8_row_by_id[c], c) for c in candidate_ids
+                    if c in self._int8_row_by_id]
+        if not rows_ids:
+            return []
+
+        rows = self._int8_matrix[[r for r, _ in rows_ids]]
+
+        # 쿼리도 같은 스케일로 양자화
+        q = np.asarray(
+            _embed_query_cached(self._embed_key, query), dtype=np.float32
+        )
+        q_i8 = np.clip(np.round(q / self._int8_scale), -127, 127).astype(np.int8)
+
+        if HAS_SIMSIMD:
+            sims = 1.0 - np.asarray(
+                simsimd.cdist(q_i8[None, :], rows, metric="cosine"),
+                dtype=np.float32
+            ).ravel()
+        else:
+            rows_f = rows.astype(np.float32)
+            norms = np.linalg.norm(rows_f, axis=1) * float(np.linalg.norm(q_i8))
+            norms[norms == 0] = 1.0
+            sims = (rows_f @ q_i8.astype(np.float32)) / norms
+
+        order = np.argsort(sims)[::-1][:k]
+        return [
+            {"id": rows_ids[int(i)][1], "score": round(float(sims[i]), 4)}
+            for i in order
+        ]
+
     def get_relevant_documents(self, query: str) -> List[Document]:
         """
         LangChain 호환 인터페이스
@@ -155,18 +329,22 @@ class Retriever:
         if not results:
             return "관련 문서를 찾을 수 없습니다."
 
-        formatted_text = []
+        # 문서별 += 문자열 누적 대신 조각 리스트에 모아서 한 번에 join
+        # (긴 컨텍스트에서 중간 문자열 재할당을 피함)
+        parts = []
+        append = parts.append
         for i, result in enumerate(results):
-            text = f"[문서 {i+1}] (유사도: {result['score']:.2f})\n"
+            append(f"[문서 {i+1}] (유사도: {result['score']:.2f})\n")
 
             if include_metadata and result.get("metadata"):
                 source = result["metadata"].get("source", "unknown")
-                text += f"출처: {source}\n"
+                append(f"출처: {source}\n")
 
-            text += f"{result['content']}"
-            formatted_text.append(text)
+            append(result["content"])
+            append("\n\n---\n\n")
 
-        return "\n\n---\n\n".join(formatted_text)
+        # 마지막 구분자는 제거
+        return "".join(parts[:-1])
 
 
 # 사용 예시
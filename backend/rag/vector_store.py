@@ -7,9 +7,14 @@ ChromaDB를 사용하여 임베딩 벡터를 저장하고 검색합니다.
 import chromadb
 from chromadb.config import Settings
 from typing import List, Dict, Optional, Any
+import numpy as np
 import os
+import threading
 from pathlib import Path
 
+# top_k 클램프 경고는 프로세스당 한 번만 출력
+_warned_top_k_clamp = False
+
 
 class ChromaVectorStore:
     """ChromaDB 벡터 스토어 관리 클래스"""
@@ -17,7 +22,8 @@ class ChromaVectorStore:
     def __init__(
         self,
         collection_name: str = "commercial_analysis_docs",
-        persist_directory: str = None
+        persist_directory: str = None,
+        max_top_k: int = 200
     ):
         """
         ChromaDB 벡터 스토어 초기화
@@ -25,6 +31,9 @@ class ChromaVectorStore:
         Args:
             collection_name: 컬렉션 이름
             persist_directory: 데이터 저장 경로 (None이면 기본 경로 사용)
+            max_top_k: 검색 시 top_k 상한 (무제한 top_k는 HNSW의
+                병리적 경로를 타고 수천 개의 dict를 역직렬화하므로 클램프.
+                더 큰 K가 필요하면 search_many + rerank_int8 경로 사용)
         """
         # 저장 경로 설정
         if persist_directory is None:
@@ -34,6 +43,7 @@ class ChromaVectorStore:
 
         self.persist_directory = persist_directory
         self.collection_name = collection_name
+        self.max_top_k = max_top_k
 
         # 디렉토리 생성
         os.makedirs(persist_directory, exist_ok=True)
@@ -58,67 +68,215 @@ class ChromaVectorStore:
             print(f"[ERROR] ChromaDB 초기화 실패: {e}")
             raise
 
+        # 자동 ID 생성용 카운터 캐시
+        # count()는 호출마다 SQLite 쿼리라서 배치 루프에서 반복 호출하면
+        # O(배치 수)의 DB 왕복이 생김 → 한 번 읽고 로컬에서 증가
+        self._id_counter = self.collection.count()
+        self._id_lock = threading.Lock()
+
+    def tune_sqlite_pragmas(self) -> bool:
+        """
+        Chroma 내부 SQLite 연결에 쓰기 성능용 PRAGMA 적용
+
+        Chroma의 add()는 내부적으로 문서별 SQLite 트랜잭션을 돌기 때문에
+        WAL 저널링 + NORMAL 동기화로 바꾸면 insert 처리량이 크게 오릅니다.
+        내부 API에 의존하므로 실패해도 인덱싱은 계속 진행합니다.
+
+        Returns:
+            적용 성공 여부
+        """
+        pragmas = [
+            "PRAGMA journal_mode=WAL",
+            "PRAGMA synchronous=NORMAL",
+            "PRAGMA temp_store=MEMORY",
+            "PRAGMA cache_size=-262144",  # 256MB 페이지 캐시
+        ]
+        try:
+            # Chroma 버전에 따라 내부 구조가 다르므로 best-effort로 접근
+            conn = self.client._server._sysdb._conn_pool.connect()
+            for pragma in pragmas:
+                conn.execute(pragma)
+            print("[OK] SQLite PRAGMA 튜닝 적용 완료 (WAL)")
+            return True
+        except Exception as e:
+            print(f"[WARN] SQLite PRAGMA 튜닝 실패 (기본 설정으로 진행): {e}")
+            return False
+
     def add_documents(
         self,
         texts: List[str],
-        embeddings: List[List[float]],
+        embeddings: "np.ndarray",
         metadatas: Optional[List[Dict[str, Any]]] = None,
-        ids: Optional[List[str]] = None
+        ids: Optional[List[str]] = None,
+        batch_size: int = 128
     ) -> List[str]:
         """
         문서를 벡터 스토어에 추가
 
+        내부적으로 batch_size 단위로 나눠서 add()를 호출합니다.
+        (Chroma는 호출당 오버헤드가 커서 batch=1은 매우 느리고,
+        한 번에 전부 넘기면 메모리 부담이 큼 - 100~250이 권장 구간)
+
+        주의: 임베딩은 호출자가 BGEEmbeddings.embed_documents()로
+        배치 생성해서 넘겨야 합니다. 청크별 embed_query() 호출은
+        transformer의 행렬곱 처리량을 버리는 안티패턴이며,
+        이 메서드는 재임베딩하지 않습니다.
+
         Args:
             texts: 문서 텍스트 리스트
-            embeddings: 임베딩 벡터 리스트
+            embeddings: 임베딩 벡터 (float32 ndarray, shape=(N, D) 또는 리스트)
             metadatas: 메타데이터 리스트 (파일명, 날짜 등)
             ids: 문서 ID 리스트 (None이면 자동 생성)
+            batch_size: 내부 배치 크기
 
         Returns:
-            생성된 문서 ID 리스트
+            추가에 성공한 문서 ID 리스트
         """
-        if not texts or not embeddings:
+        if not texts or len(embeddings) == 0:
             raise ValueError("텍스트와 임베딩이 비어있습니다.")
 
         if len(texts) != len(embeddings):
             raise ValueError("텍스트와 임베딩의 개수가 일치하지 않습니다.")
 
-        # ID 자동 생성
-        if ids is None:
-            current_count = self.collection.count()
-            ids = [f"doc_{current_count + i}" for i in range(len(texts))]
+        # 연속 메모리 float32 배열로 통일 (리스트 입력도 수용)
+        # → Python float 리스트(벡터당 ~28KB)를 끝까지 들고 다니지 않음
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+
+        # ID 자동 생성 (캐시된 카운터 사용 - count() 재호출 없음)
+        auto_ids = ids is None
+        if auto_ids:
+            with self._id_lock:
+                start = self._id_counter
+                self._id_counter += len(texts)
+            ids = [f"doc_{start + i}" for i in range(len(texts))]
 
         # 메타데이터 기본값 설정
         if metadatas is None:
             metadatas = [{"source": "unknown"} for _ in texts]
 
+        added_ids = []
+        for i in range(0, len(texts), batch_size):
+            batch_ids = ids[i:i + batch_size]
+            try:
+                self.collection.add(
+                    documents=texts[i:i + batch_size],
+                    embeddings=embeddings[i:i + batch_size],
+                    metadatas=metadatas[i:i + batch_size],
+                    ids=batch_ids
+                )
+                added_ids.extend(batch_ids)
+            except Exception as e:
+                # 자동 생성 ID가 충돌한 경우(드문 외부 writer 경합)
+                # 카운터를 DB와 재동기화하고 한 번만 재시도
+                if auto_ids:
+                    with self._id_lock:
+                        self._id_counter = self.collection.count()
+                        start = self._id_counter
+                        self._id_counter += len(batch_ids)
+                    batch_ids = [f"doc_{start + j}" for j in range(len(batch_ids))]
+                    try:
+                        self.collection.add(
+                            documents=texts[i:i + batch_size],
+                            embeddings=embeddings[i:i + batch_size],
+                            metadatas=metadatas[i:i + batch_size],
+                            ids=batch_ids
+                        )
+                        added_ids.extend(batch_ids)
+                        continue
+                    except Exception:
+                        # 재시도도 실패 → 원래 예외(e)를 아래에서 기록
+                        # (as e로 받으면 바깥 e가 unbind되어 로그가 깨짐)
+                        pass
+                # 불량 레코드 하나 때문에 전체 ingest가 중단되지 않도록
+                # 실패한 구간만 기록하고 계속 진행
+                print(f"[ERROR] 문서 추가 실패 (배치 {i}~{i + batch_size}): {e}")
+
+        print(f"[OK] {len(added_ids)}개 문서 추가 완료")
+        return added_ids
+
+    def search_many(
+        self,
+        query_embeddings: "np.ndarray",
+        top_k: int = 5,
+        filter_metadata: Optional[Dict[str, Any]] = None,
+        include_embeddings: bool = False
+    ) -> List[Dict[str, Any]]:
+        """
+        여러 쿼리 임베딩을 한 번의 Chroma 호출로 검색
+
+        collection.query()는 N개의 쿼리를 한 호출에 받아 함께 처리하므로
+        (HNSW 워밍업과 Python→C++ 전환 공유) HyDE/멀티쿼리 검색이나
+        동시 사용자 fan-out에서 쿼리별 개별 호출보다 훨씬 유리합니다.
+
+        Args:
+            query_embeddings: 쿼리 임베딩 행렬 (float32 ndarray, shape=(N, D))
+            top_k: 쿼리당 반환할 문서 개수
+            filter_metadata: 메타데이터 필터 (예: {"source": "guide.pdf"})
+            include_embeddings: 검색된 문서의 임베딩도 함께 반환 (리랭킹용)
+
+        Returns:
+            쿼리별 검색 결과 딕셔너리 리스트 (search()와 동일 형식)
+        """
+        # 무제한 top_k 방어 (생성자 docstring 참고)
+        if top_k > self.max_top_k:
+            global _warned_top_k_clamp
+            if not _warned_top_k_clamp:
+                _warned_top_k_clamp = True
+                print(f"[WARN] top_k={top_k} 요청을 상한 {self.max_top_k}로 클램프합니다.")
+            top_k = self.max_top_k
+
         try:
-            # 문서 추가
-            self.collection.add(
-                documents=texts,
-                embeddings=embeddings,
-                metadatas=metadatas,
-                ids=ids
+            # Chroma 경계 직전에만 list로 변환
+            query_embeddings = np.atleast_2d(
+                np.asarray(query_embeddings, dtype=np.float32)
             )
-            print(f"[OK] {len(texts)}개 문서 추가 완료")
-            return ids
+
+            include = ["documents", "metadatas", "distances"]
+            if include_embeddings:
+                include.append("embeddings")
+
+            # 검색 수행 (N개 쿼리를 단일 호출로)
+            results = self.collection.query(
+                query_embeddings=query_embeddings.tolist(),
+                n_results=top_k,
+                where=filter_metadata,  # 메타데이터 필터링
+                include=include
+            )
+
+            # 쿼리별 결과 버킷으로 정리
+            n_queries = len(results["ids"])
+            formatted_results = []
+            for q in range(n_queries):
+                bucket = {
+                    "documents": results["documents"][q] if results["documents"] else [],
+                    "metadatas": results["metadatas"][q] if results["metadatas"] else [],
+                    "distances": results["distances"][q] if results["distances"] else [],
+                    "ids": results["ids"][q]
+                }
+                if include_embeddings and results.get("embeddings") is not None:
+                    bucket["embeddings"] = results["embeddings"][q]
+                formatted_results.append(bucket)
+
+            return formatted_results
         except Exception as e:
-            print(f"[ERROR] 문서 추가 실패: {e}")
+            print(f"[ERROR] 검색 실패: {e}")
             raise
 
     def search(
         self,
-        query_embedding: List[float],
+        query_embedding: "np.ndarray",
         top_k: int = 5,
-        filter_metadata: Optional[Dict[str, Any]] = None
+        filter_metadata: Optional[Dict[str, Any]] = None,
+        include_embeddings: bool = False
     ) -> Dict[str, Any]:
         """
-        유사도 기반 문서 검색
+        유사도 기반 문서 검색 (단일 쿼리 - search_many의 특수 경우)
 
         Args:
-            query_embedding: 검색 쿼리 임베딩 벡터
+            query_embedding: 검색 쿼리 임베딩 벡터 (float32 ndarray, shape=(D,))
             top_k: 반환할 문서 개수
             filter_metadata: 메타데이터 필터 (예: {"source": "guide.pdf"})
+            include_embeddings: 검색된 문서의 임베딩도 함께 반환 (리랭킹용)
 
         Returns:
             검색 결과 딕셔너리
@@ -129,26 +287,15 @@ class ChromaVectorStore:
                 "ids": [...]
             }
         """
-        try:
-            # 검색 수행
-            results = self.collection.query(
-                query_embeddings=[query_embedding],
-                n_results=top_k,
-                where=filter_metadata  # 메타데이터 필터링
-            )
-
-            # 결과 정리
-            formatted_results = {
-                "documents": results["documents"][0] if results["documents"] else [],
-                "metadatas": results["metadatas"][0] if results["metadatas"] else [],
-                "distances": results["distances"][0] if results["distances"] else [],
-                "ids": results["ids"][0] if results["ids"] else []
-            }
-
-            return formatted_results
-        except Exception as e:
-            print(f"[ERROR] 검색 실패: {e}")
-            raise
+        buckets = self.search_many(
+            query_embeddings=query_embedding,
+            top_k=top_k,
+            filter_metadata=filter_metadata,
+            include_embeddings=include_embeddings
+        )
+        if not buckets:
+            return {"documents": [], "metadatas": [], "distances": [], "ids": []}
+        return buckets[0]
 
     def delete_documents(self, ids: List[str]) -> bool:
         """
@@ -168,6 +315,28 @@ class ChromaVectorStore:
             print(f"[ERROR] 문서 삭제 실패: {e}")
             return False
 
+    def clear(self) -> bool:
+        """
+        컬렉션의 모든 문서 삭제 (컬렉션과 클라이언트는 유지)
+
+        delete_collection 후 재생성하면 SQLite 재오픈 + HNSW 인덱스
+        cold start가 두 번 발생하므로, 같은 컬렉션에서 행만 지워
+        파일 핸들/페이지 캐시(그리고 적용된 PRAGMA)를 유지합니다.
+
+        Returns:
+            성공 여부
+        """
+        try:
+            ids = self.collection.get(include=[])["ids"]
+            # 한 번에 너무 많은 id를 넘기지 않도록 나눠서 삭제
+            for i in range(0, len(ids), 5000):
+                self.collection.delete(ids=ids[i:i + 5000])
+            print(f"[OK] 컬렉션 비우기 완료 ({len(ids)}개 삭제)")
+            return True
+        except Exception as e:
+            print(f"[ERROR] 컬렉션 비우기 실패: {e}")
+            return False
+
     def delete_collection(self) -> bool:
         """
         컬렉션 전체 삭제
@@ -192,28 +361,155 @@ class ChromaVectorStore:
         collections = self.client.list_collections()
         return [col.name for col in collections]
 
-    def get_all_documents(self, limit: int = None) -> Dict[str, Any]:
+    def iter_all_documents(
+        self,
+        page_size: int = 10_000,
+        include_embeddings: bool = False,
+        limit: int = None
+    ):
+        """
+        모든 문서를 페이지 단위로 순회하는 제너레이터
+
+        전체 컬렉션을 dict 하나로 당겨오면 벡터 수백만 개 규모에서
+        OOM으로 이어지므로, limit/offset 페이징으로 page_size씩만
+        메모리에 올립니다. 피크 메모리가 O(N) → O(page_size)로 줄어듭니다.
+
+        Args:
+            page_size: 페이지당 문서 개수
+            include_embeddings: 임베딩 벡터 포함 여부
+            limit: 총 조회 개수 상한 (None이면 전체 - 마지막 페이지는
+                남은 개수만큼만 요청하므로 작은 limit에서 과조회가 없음)
+
+        Yields:
+            페이지 단위 문서 딕셔너리 (collection.get()과 동일 형식)
+        """
+        include = ["documents", "metadatas"]
+        if include_embeddings:
+            include.append("embeddings")
+
+        offset = 0
+        while True:
+            request = page_size if limit is None else min(page_size, limit - offset)
+            if request <= 0:
+                break
+
+            try:
+                page = self.collection.get(
+                    limit=request,
+                    offset=offset,
+                    include=include
+                )
+            except Exception as e:
+                print(f"[ERROR] 문서 조회 실패 (offset={offset}): {e}")
+                raise
+
+            if not page["ids"]:
+                break
+
+            yield page
+
+            if len(page["ids"]) < request:
+                break
+            offset += len(page["ids"])
+
+    def store_quantized_copy(self, scale_per_dim: bool = True) -> Optional[str]:
+        """
+        저장된 임베딩의 int8 사본을 사이드카 .npy 파일로 생성
+
+        int8 행렬은 fp32 대비 메모리/대역폭이 1/4이라 대용량 top-K
+        리랭킹을 전부 메모리에서 처리할 수 있습니다 (Retriever.rerank_int8
+        참고). 페이지 단위로 두 번 순회하므로 피크 메모리는 O(page_size):
+        1차로 차원별 최대 절댓값(스케일)을 구하고, 2차로 양자화해
+        memmap에 기록합니다.
+
+        생성 파일 (data/ 아래):
+            rerank_int8.npy       (N, D) int8 양자화 임베딩
+            rerank_int8_scale.npy (D,) float32 차원별 스케일
+            rerank_int8_ids.npy   (N,) 문서 ID
+
+        Args:
+            scale_per_dim: 차원별 스케일 사용 (False면 전역 스칼라 스케일)
+
+        Returns:
+            int8 행렬 파일 경로 (컬렉션이 비어있으면 None)
+        """
+        n = self.collection.count()
+        if n == 0:
+            print("[WARN] 컬렉션이 비어있어 int8 사본을 생성하지 않습니다.")
+            return None
+
+        data_dir = Path(self.persist_directory).parent
+        int8_path = str(data_dir / "rerank_int8.npy")
+        scale_path = str(data_dir / "rerank_int8_scale.npy")
+        ids_path = str(data_dir / "rerank_int8_ids.npy")
+
+        # 1차 순회: 차원별 최대 절댓값으로 스케일 결정
+        max_abs = None
+        for page in self.iter_all_documents(include_embeddings=True):
+            embs = np.asarray(page["embeddings"], dtype=np.float32)
+            page_max = np.abs(embs).max(axis=0)
+            max_abs = page_max if max_abs is None else np.maximum(max_abs, page_max)
+
+        if not scale_per_dim:
+            max_abs = np.full_like(max_abs, float(max_abs.max()))
+        scale = np.maximum(max_abs / 127.0, 1e-12).astype(np.float32)
+
+        # 2차 순회: 양자화하여 memmap에 기록
+        dim = scale.shape[0]
+        quantized = np.lib.format.open_memmap(
+            int8_path, mode="w+", dtype=np.int8, shape=(n, dim)
+        )
+        all_ids = []
+        offset = 0
+        for page in self.iter_all_documents(include_embeddings=True):
+            embs = np.asarray(page["embeddings"], dtype=np.float32)
+            rows = np.clip(np.round(embs / scale), -127, 127).astype(np.int8)
+            quantized[offset:offset + len(rows)] = rows
+            all_ids.extend(page["ids"])
+            offset += len(rows)
+        quantized.flush()
+
+        np.save(scale_path, scale)
+        np.save(ids_path, np.asarray(all_ids))
+
+        print(f"[OK] int8 임베딩 사본 생성 완료 ({offset}개, {int8_path})")
+        return int8_path
+
+    def get_all_documents(
+        self,
+        limit: int = None,
+        include_embeddings: bool = False
+    ) -> Dict[str, Any]:
         """
         모든 문서 조회
 
+        주의: 전체를 한 dict로 모으므로 대형 컬렉션에서는
+        iter_all_documents() 사용을 권장합니다 (deprecated 예정).
+
+        임베딩은 기본적으로 제외합니다. 벡터까지 가져오면 수백만 개의
+        float가 Chroma 경계를 넘어와 Python 리스트로 역직렬화되는데,
+        대부분의 호출자(UI 목록 등)는 documents/metadatas만 필요합니다.
+
         Args:
             limit: 최대 조회 개수 (None이면 전체)
+            include_embeddings: 임베딩 벡터 포함 여부
 
         Returns:
             문서 딕셔너리
         """
-        try:
-            if limit is None:
-                limit = self.collection.count()
-
-            results = self.collection.get(
-                limit=limit,
-                include=["documents", "metadatas", "embeddings"]
-            )
-            return results
-        except Exception as e:
-            print(f"[ERROR] 문서 조회 실패: {e}")
-            raise
+        results: Dict[str, Any] = {"ids": [], "documents": [], "metadatas": []}
+        if include_embeddings:
+            results["embeddings"] = []
+
+        # limit을 페이지 요청에 그대로 전달 → 작은 limit은 그만큼만 조회
+        for page in self.iter_all_documents(
+            include_embeddings=include_embeddings, limit=limit
+        ):
+            for key in results:
+                if page.get(key) is not None:
+                    results[key].extend(page[key])
+
+        return results
 
 
 # 사용 예시